@@ -9,4 +9,4 @@ if [[ ! -x "$ENV_PATH/bin/python" ]]; then
   "$SCRIPT_DIR/setup.sh"
 fi
 
-exec "$ENV_PATH/bin/python" "$SCRIPT_DIR/wav_merger.py"
+exec "$ENV_PATH/bin/python" "$SCRIPT_DIR/wav_merger.py" "$@"
@@ -0,0 +1,62 @@
+"""Manual session edits survive incremental updates of SessionIndex."""
+
+from __future__ import annotations
+
+import sys
+from datetime import datetime, timedelta
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import wav_merger_core as core  # noqa: E402
+
+BASE = datetime(2024, 1, 1, 10, 0, 0)
+
+
+def chunk(name: str, minute: float, duration: float = 60.0) -> core.AudioFile:
+    return core.AudioFile(path=Path(name), duration=duration, size=1, start_time=BASE + timedelta(minutes=minute))
+
+
+def names(index: core.SessionIndex) -> list[list[str]]:
+    return [[item.path.name for item in group.files] for group in index.groups]
+
+
+def test_manual_merge_survives_insert_and_remove() -> None:
+    index = core.SessionIndex(threshold_minutes=2)
+    index.rebuild([chunk("a", 0), chunk("b", 30), chunk("c", 60)], 2)
+    assert names(index) == [["a"], ["b"], ["c"]]
+    first, second, third = index.groups
+    merged = core.RecordingGroup(files=first.files + second.files)
+    index.set_groups([merged, third])
+
+    index.add([chunk("d", 45)])
+    assert names(index) == [["a", "b"], ["d"], ["c"]]
+    index.add([chunk("e", 31)])
+    assert names(index) == [["a", "b", "e"], ["d"], ["c"]]
+    index.remove([index.groups[0].files[0]])
+    assert names(index) == [["b", "e"], ["d"], ["c"]]
+
+
+def test_manual_split_survives_insert_and_remove() -> None:
+    index = core.SessionIndex(threshold_minutes=2)
+    index.rebuild([chunk("a", 0), chunk("b", 1), chunk("c", 2)], 2)
+    files = index.groups[0].files
+    index.splice(0, 1, [core.RecordingGroup(files=files[:1]), core.RecordingGroup(files=files[1:])], pinned=True)
+
+    index.add([chunk("d", 3)])
+    assert names(index) == [["a"], ["b", "c", "d"]]
+    index.remove([files[1]])
+    assert names(index) == [["a"], ["c", "d"]]
+
+    # A full regroup drops the manual edits.
+    index.rebuild([item for group in index.groups for item in group.files], 2)
+    assert names(index) == [["a", "c", "d"]]
+
+
+def test_gap_histogram_counts_overlaps() -> None:
+    # "b" starts before "a" ends, so one of the three gaps is negative.
+    gaps = core.GapIndex([chunk("a", 0, 90), chunk("b", 1), chunk("c", 2.5), chunk("d", 10)])
+    assert gaps.session_count(60) == 2
+    counts = gaps.histogram([0.0, 60.0, float("inf")])
+    assert counts == [2, 1]
+    assert sum(counts) == len(gaps.gaps)
@@ -0,0 +1,355 @@
+"""
+Benchmarks for the DJI Mic recording organizer.
+
+Generates a synthetic tree of DJI-style WAV chunks, then times the scan,
+grouping, list rendering and export stages against it and prints one JSON
+report, so runs on the same machine can be compared over time:
+
+    python wav_merger_bench.py --sessions 20 --chunks 6 > bench.json
+
+The tree lives in a temporary folder that is removed afterwards unless
+``--root`` or ``--keep`` is given. Nothing touches the user's config or
+scan cache.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import platform
+import random
+import shutil
+import struct
+import sys
+import tempfile
+import time
+from dataclasses import asdict, dataclass
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Callable
+
+from wav_merger_core import (
+    FORMAT_PRESETS,
+    Exporter,
+    ExportSettings,
+    ScanCache,
+    Scanner,
+    extract_start_time,
+    find_wav_files,
+    locate_ffmpeg,
+    output_name_for_group,
+    regroup_files,
+)
+
+try:
+    import resource
+except ImportError:  # Windows has no getrusage.
+    resource = None
+
+
+# Random audio is written in blocks of this size and repeated, so generation stays disk bound.
+NOISE_BLOCK_SIZE = 1024 * 1024
+DEFAULT_START = datetime(2024, 1, 1, 9, 0, 0)
+
+
+@dataclass
+class TreeSpec:
+    sessions: int = 5
+    chunks: int = 4
+    chunk_seconds: float = 30.0
+    # Silence between sessions; keep it above the grouping threshold so sessions stay apart.
+    gap_seconds: float = 600.0
+    nested_depth: int = 1
+    corrupt: int = 2
+    channels: int = 2
+    sample_rate: int = 48000
+    bits_per_sample: int = 24
+    seed: int = 1
+
+    @property
+    def total_duration(self) -> float:
+        return self.sessions * self.chunks * self.chunk_seconds
+
+
+def generate_tree(root: Path, spec: TreeSpec) -> list[Path]:
+    """Write ``spec.sessions`` sessions of back-to-back DJI chunks below ``root`` and return every path written."""
+    rng = random.Random(spec.seed)
+    noise = rng.randbytes(NOISE_BLOCK_SIZE)
+    block_align = spec.channels * ((spec.bits_per_sample + 7) // 8)
+    data_size = int(spec.chunk_seconds * spec.sample_rate) * block_align
+    written: list[Path] = []
+    counter = 0
+    start = DEFAULT_START
+
+    for session in range(spec.sessions):
+        folder = root
+        for level in range(spec.nested_depth):
+            # DJI receivers create one numbered folder per card session; nest further levels for depth tests.
+            folder = folder / f"DJI_Audio_{(session >> level) % 100:03d}"
+        folder.mkdir(parents=True, exist_ok=True)
+
+        for chunk in range(spec.chunks):
+            counter += 1
+            chunk_start = start + timedelta(seconds=chunk * spec.chunk_seconds)
+            path = folder / f"DJI_{counter:02d}_{chunk_start:%Y%m%d_%H%M%S}.WAV"
+            write_wav(path, spec, data_size, noise)
+            written.append(path)
+        start += timedelta(seconds=spec.chunks * spec.chunk_seconds + spec.gap_seconds)
+
+    for index in range(spec.corrupt):
+        counter += 1
+        path = root / f"DJI_{counter:02d}_{start + timedelta(seconds=index):%Y%m%d_%H%M%S}.WAV"
+        # A RIFF header whose fmt chunk is cut short, the way an interrupted recording looks.
+        path.write_bytes(b"RIFF" + struct.pack("<I", 28) + b"WAVEfmt " + struct.pack("<I", 16) + b"\x01\x00")
+        written.append(path)
+    return written
+
+
+def write_wav(path: Path, spec: TreeSpec, data_size: int, noise: bytes) -> None:
+    block_align = spec.channels * ((spec.bits_per_sample + 7) // 8)
+    fmt_chunk = struct.pack(
+        "<HHIIHH",
+        1,
+        spec.channels,
+        spec.sample_rate,
+        spec.sample_rate * block_align,
+        block_align,
+        spec.bits_per_sample,
+    )
+    with path.open("wb") as output:
+        output.write(b"RIFF" + struct.pack("<I", 4 + 8 + len(fmt_chunk) + 8 + data_size + (data_size & 1)))
+        output.write(b"WAVEfmt " + struct.pack("<I", len(fmt_chunk)) + fmt_chunk)
+        output.write(b"data" + struct.pack("<I", data_size))
+        remaining = data_size
+        while remaining:
+            block = noise[: min(remaining, len(noise))]
+            output.write(block)
+            remaining -= len(block)
+        if data_size & 1:
+            output.write(b"\0")
+
+
+def timed(repeat: int, func: Callable[[], object]) -> tuple[dict, object]:
+    """Run ``func`` ``repeat`` times; report the best and every wall time, and return the last result."""
+    runs: list[float] = []
+    result: object = None
+    for _ in range(max(1, repeat)):
+        started = time.perf_counter()
+        result = func()
+        runs.append(time.perf_counter() - started)
+    return {"seconds": min(runs), "runs": runs}, result
+
+
+def peak_rss_bytes() -> dict:
+    if resource is None:
+        return {"self": None, "children": None}
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS.
+    scale = 1 if sys.platform == "darwin" else 1024
+    return {
+        "self": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale,
+        "children": resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss * scale,
+    }
+
+
+def bench_scan(root: Path, scratch: Path, repeat: int) -> tuple[dict, list]:
+    report: dict = {}
+    report["find_wav_files"], paths = timed(repeat, lambda: find_wav_files(root, True))
+    report["find_wav_files"]["files_per_second"] = rate(len(paths), report["find_wav_files"]["seconds"])
+
+    def cold_scan() -> tuple[list, int]:
+        cache_path = scratch / "cold.sqlite3"
+        cache_path.unlink(missing_ok=True)
+        cache = ScanCache(cache_path)
+        try:
+            return Scanner(locate_ffmpeg(), cache).inspect_paths(paths)
+        finally:
+            cache.close()
+
+    report["inspect_paths_cold"], (files, skipped) = timed(repeat, cold_scan)
+    report["inspect_paths_cold"]["files_per_second"] = rate(len(paths), report["inspect_paths_cold"]["seconds"])
+    report["inspect_paths_cold"]["skipped"] = skipped
+
+    warm_cache = ScanCache(scratch / "warm.sqlite3")
+    try:
+        Scanner(locate_ffmpeg(), warm_cache).inspect_paths(paths)
+        report["inspect_paths_warm"], _ = timed(repeat, lambda: Scanner(locate_ffmpeg(), warm_cache).inspect_paths(paths))
+    finally:
+        warm_cache.close()
+    report["inspect_paths_warm"]["files_per_second"] = rate(len(paths), report["inspect_paths_warm"]["seconds"])
+
+    report["extract_start_time"], _ = timed(repeat, lambda: [extract_start_time(path, 0.0) for path in paths])
+    report["extract_start_time"]["files_per_second"] = rate(len(paths), report["extract_start_time"]["seconds"])
+    return report, files
+
+
+def bench_grouping(files: list, threshold_minutes: float, repeat: int) -> tuple[dict, list]:
+    report, groups = timed(repeat, lambda: regroup_files(files, threshold_minutes))
+    report["files_per_second"] = rate(len(files), report["seconds"])
+    report["sessions"] = len(groups)
+    return report, groups
+
+
+def bench_tree_refresh(groups: list, repeat: int) -> dict:
+    """Scroll the session list top to bottom one page at a time; needs a display."""
+    try:
+        import tkinter as tk
+
+        from wav_merger_gui import VirtualTreeview
+
+        root = tk.Tk()
+    except Exception as exc:
+        return {"skipped": f"tkinter unavailable: {exc}"}
+
+    try:
+        root.withdraw()
+        view = VirtualTreeview(
+            root,
+            ("index", "start", "files", "duration", "size"),
+            row_count=lambda: len(groups),
+            row_values=lambda index: (
+                index + 1,
+                f"{groups[index].start_time:%Y-%m-%d %H:%M:%S}",
+                len(groups[index].files),
+                round(groups[index].duration),
+                groups[index].size,
+            ),
+        )
+
+        def scroll_through() -> int:
+            pages = 0
+            view.reset()
+            while True:
+                pages += 1
+                top = view.top
+                view.scroll_by(view.page)
+                root.update_idletasks()
+                if view.top == top:
+                    return pages
+
+        report, pages = timed(repeat, scroll_through)
+        report["pages"] = pages
+        report["pages_per_second"] = rate(pages, report["seconds"])
+        return report
+    finally:
+        root.destroy()
+
+
+def bench_exports(groups: list, output: Path, presets: list[str], repeat: int) -> dict:
+    """Export the first session once per preset, then to every preset at once, and report the realtime factors."""
+    ffmpeg = locate_ffmpeg()
+    output.mkdir(parents=True, exist_ok=True)
+    group = groups[0]
+    source_bytes = group.size
+    report: dict = {}
+    # Each preset on its own, then all of them written from a single read of the sources.
+    runs = [[key] for key in presets] + ([list(presets)] if len(presets) > 1 else [])
+    for keys in runs:
+        key = "+".join(keys)
+        if any(name != "wav" for name in keys) and not ffmpeg:
+            report[key] = {"skipped": "ffmpeg not found"}
+            continue
+        settings = ExportSettings(
+            format=keys[0],
+            bitrate=FORMAT_PRESETS[keys[0]]["default_bitrate"],
+            mix_to_mono=True,
+            extra_formats=tuple(keys[1:]),
+        )
+        exporter = Exporter(ffmpeg, settings, workers=1)
+        targets = [output / output_name_for_group(group, variant) for variant in settings.variants()]
+
+        def run() -> int:
+            for target in targets:
+                target.unlink(missing_ok=True)
+            exporter.export_group(group, targets, lambda _seconds: None)
+            return sum(target.stat().st_size for target in targets)
+
+        report[key], written = timed(repeat, run)
+        report[key]["realtime_factor"] = rate(group.duration, report[key]["seconds"])
+        report[key]["read_mb_per_second"] = rate(source_bytes / 1e6, report[key]["seconds"])
+        report[key]["output_bytes"] = written
+    return report
+
+
+def rate(amount: float, seconds: float) -> float | None:
+    return round(amount / seconds, 3) if seconds > 0 else None
+
+
+def build_parser() -> argparse.ArgumentParser:
+    defaults = TreeSpec()
+    parser = argparse.ArgumentParser(prog="wav_merger_bench", description="生成模拟 DJI 录音并测量扫描、分组和导出耗时。")
+    parser.add_argument("--root", help="生成测试文件的目录（会保留）；默认使用临时目录")
+    parser.add_argument("--keep", action="store_true", help="保留临时目录中的文件和导出结果")
+    parser.add_argument("--sessions", type=int, default=defaults.sessions)
+    parser.add_argument("--chunks", type=int, default=defaults.chunks, help="每个会话的分段数")
+    parser.add_argument("--chunk-seconds", type=float, default=defaults.chunk_seconds)
+    parser.add_argument("--gap-seconds", type=float, default=defaults.gap_seconds, help="会话之间的间隔")
+    parser.add_argument("--nested-depth", type=int, default=defaults.nested_depth)
+    parser.add_argument("--corrupt", type=int, default=defaults.corrupt, help="头部损坏的文件数")
+    parser.add_argument("--channels", type=int, default=defaults.channels)
+    parser.add_argument("--sample-rate", type=int, default=defaults.sample_rate)
+    parser.add_argument("--bits", dest="bits_per_sample", type=int, default=defaults.bits_per_sample)
+    parser.add_argument("--seed", type=int, default=defaults.seed)
+    parser.add_argument("--threshold", type=float, default=2.0, help="分组间隔（分钟）")
+    parser.add_argument("--presets", default=",".join(FORMAT_PRESETS), help="逗号分隔的导出格式")
+    parser.add_argument("--repeat", type=int, default=3, help="每项重复次数，报告最快一次")
+    parser.add_argument("--skip-tree", action="store_true", help="不测量列表刷新（需要图形界面）")
+    return parser
+
+
+def main(argv: list[str] | None = None) -> int:
+    args = build_parser().parse_args(argv)
+    presets = [key.strip() for key in args.presets.split(",") if key.strip()]
+    unknown = [key for key in presets if key not in FORMAT_PRESETS]
+    if unknown:
+        raise SystemExit(f"未知格式：{', '.join(unknown)}")
+
+    spec = TreeSpec(
+        sessions=max(1, args.sessions),
+        chunks=max(1, args.chunks),
+        chunk_seconds=args.chunk_seconds,
+        gap_seconds=args.gap_seconds,
+        nested_depth=max(0, args.nested_depth),
+        corrupt=max(0, args.corrupt),
+        channels=args.channels,
+        sample_rate=args.sample_rate,
+        bits_per_sample=args.bits_per_sample,
+        seed=args.seed,
+    )
+    scratch = Path(tempfile.mkdtemp(prefix="wav_merger_bench_"))
+    root = Path(args.root).expanduser() if args.root else scratch / "tree"
+    try:
+        generated, paths = timed(1, lambda: generate_tree(root, spec))
+        generated["files"] = len(paths)
+        generated["bytes"] = sum(path.stat().st_size for path in paths)
+
+        scan, files = bench_scan(root, scratch, args.repeat)
+        grouping, groups = bench_grouping(files, args.threshold, args.repeat)
+        report = {
+            "created": datetime.now().isoformat(timespec="seconds"),
+            "machine": {
+                "python": platform.python_version(),
+                "platform": platform.platform(),
+                "cpu_count": os.cpu_count(),
+                "ffmpeg": locate_ffmpeg(),
+            },
+            "spec": asdict(spec),
+            "audio_seconds": spec.total_duration,
+            "generate": generated,
+            "scan": scan,
+            "regroup_files": grouping,
+            "tree_refresh": {"skipped": "--skip-tree"} if args.skip_tree else bench_tree_refresh(groups, args.repeat),
+            "export_group": bench_exports(groups, scratch / "out", presets, args.repeat) if groups else {},
+        }
+        report["peak_rss_bytes"] = peak_rss_bytes()
+    finally:
+        if not args.keep:
+            shutil.rmtree(scratch, ignore_errors=True)
+
+    json.dump(report, sys.stdout, ensure_ascii=False, indent=2)
+    sys.stdout.write("\n")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,3302 @@
+"""
+Scanning, grouping and export engine for the DJI Mic recording organizer.
+
+Nothing here imports tkinter, so the same code drives the desktop app, the
+command line and headless batch jobs.
+"""
+
+from __future__ import annotations
+
+import csv
+import fnmatch
+import hashlib
+import json
+import mmap
+import os
+import re
+import shutil
+import sqlite3
+import struct
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from bisect import bisect_left, bisect_right, insort
+from collections import deque
+from contextlib import contextmanager
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, as_completed, wait
+from dataclasses import dataclass, field, replace
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import BinaryIO, Callable, Iterable, Iterator, Sequence
+
+try:
+    from send2trash import send2trash
+except ImportError:  # setup installs it for normal use.
+    send2trash = None
+
+try:
+    import numpy as np
+except ImportError:  # Only silence trimming and the waveform need it; setup installs it for normal use.
+    np = None
+
+
+CONFIG_PATH = Path.home() / ".wav_merger_config.json"
+SCAN_CACHE_PATH = CONFIG_PATH.with_name(".wav_merger_scan_cache.sqlite3")
+RUN_LOG_PATH = CONFIG_PATH.with_name(".wav_merger_last_run.json")
+PEAK_CACHE_PATH = CONFIG_PATH.with_name(".wav_merger_peak_cache.sqlite3")
+EXPORT_CACHE_DIR = CONFIG_PATH.with_name(".wav_merger_export_cache")
+# Stored outputs beyond this many bytes are evicted, least recently used first.
+EXPORT_CACHE_LIMIT = 10 * 1024**3
+# Local scratch space that source staging may fill with sessions waiting to be encoded.
+STAGE_BUDGET = 4 * 1024**3
+SUPPORTED_EXTENSIONS = {".wav", ".wave"}
+EPOCH = datetime(1970, 1, 1)
+# Directory names the scanner never enters, matched case-insensitively as globs; hidden folders are always skipped.
+DEFAULT_SCAN_IGNORE = ("$RECYCLE.BIN", "System Volume Information", "__MACOSX", "*.app")
+DEFAULT_EXPORT_WORKERS = max(1, os.cpu_count() or 1)
+# Header reads are I/O bound, so the scan pool is wider than the CPU count.
+SCAN_WORKERS = min(32, DEFAULT_EXPORT_WORKERS * 4)
+SCAN_BATCH_SIZE = 200
+SCAN_BATCH_INTERVAL = 0.3
+# Paths in flight per scan worker; the walk is only read this far ahead of the probes.
+SCAN_WINDOW_PER_WORKER = 4
+WATCH_INTERVAL = 30.0
+# Watch mode runs for weeks; its run log keeps per-session rows for only this many recent sessions.
+WATCH_SESSION_HISTORY = 1000
+WATCH_STATE_NAME = ".wav_merger_watch.json"
+EXPORT_JOURNAL_NAME = ".wav_merger_export.json"
+# Journal entries not touched for this long are dropped, so a long watch run does not rewrite an ever-growing file.
+EXPORT_JOURNAL_RETENTION_DAYS = 90
+# Outputs whose header duration does not match their session are moved here; their sources are kept.
+QUARANTINE_DIR_NAME = "_quarantine"
+# Adding more than this share of the library at once rebuilds every session instead of inserting file by file.
+BULK_REGROUP_RATIO = 0.25
+
+WAVE_FORMAT_PCM = 0x0001
+WAVE_FORMAT_IEEE_FLOAT = 0x0003
+WAVE_FORMAT_EXTENSIBLE = 0xFFFE
+RIFF_SIZE_PLACEHOLDER = 0xFFFFFFFF
+# Largest chunk payload read into memory while walking headers; bigger chunks are skipped with seek().
+HEADER_CHUNK_LIMIT = 64 * 1024
+COPY_CHUNK_SIZE = 8 * 1024 * 1024
+# Content fingerprints hash the format, the data size and this many blocks spread over the audio data.
+FINGERPRINT_BLOCKS = 4
+FINGERPRINT_BLOCK_SIZE = 64 * 1024
+# Sessions shorter than this are never split for parallel encoding, and no segment is shorter than this.
+SPLIT_SEGMENT_SECONDS = 600.0
+# Audio encoded before and after each segment so the encoder has real context at the joins.
+SPLIT_CONTEXT_SECONDS = 0.2
+# Silence analysis: RMS/peak window, shortest span worth caching, and how far a peak may rise above the
+# RMS threshold before the window counts as sound (a door click is not dead air).
+SILENCE_WINDOW_SECONDS = 0.05
+SILENCE_SPAN_MIN_SECONDS = 1.0
+SILENCE_PEAK_MARGIN_DB = 20.0
+ANALYSIS_BLOCK_FRAMES = 1 << 20
+# Waveform pyramid: level 0 keeps one min/max pair per bucket, each level above folds this many of the one below.
+PEAK_BUCKET_SECONDS = 0.01
+PEAK_LEVEL_FACTOR = 4
+# Parallel jobs report progress many times a second; listeners hear about it at most this often.
+PROGRESS_EMIT_INTERVAL = 0.1
+# Lines of ffmpeg output kept for the error message of a failed export.
+FFMPEG_TAIL_LINES = 40
+# Allowed difference between an output's header duration and its session: encoder delay and padding, plus
+# up to a few codec frames per trimmed silence, since ffmpeg's aselect drops whole frames.
+VERIFY_TOLERANCE_SECONDS = 1.0
+VERIFY_CUT_TOLERANCE_SECONDS = 0.1
+
+
+FORMAT_PRESETS = {
+    "m4a": {
+        "label": "M4A / AAC（推荐）",
+        "extension": ".m4a",
+        "codec_args": ["-c:a", "aac"],
+        "bitrates": ["48", "64", "96", "128"],
+        "default_bitrate": "64",
+        # Split encodes: segments are written as raw ADTS frames and remuxed into MP4 once at the end.
+        "segment_args": ["-f", "adts"],
+        # ffmpeg writes ADTS with the "adts" muxer but reads it back with the "aac" demuxer.
+        "segment_demuxer": "aac",
+        "remux_args": ["-bsf:a", "aac_adtstoasc", "-movflags", "+faststart"],
+        "frame_size": 1024,
+        # ffmpeg's AAC encoder primes the stream with one frame of delay.
+        "encoder_delay": 1024,
+    },
+    "mp3": {
+        "label": "MP3（兼容优先）",
+        "extension": ".mp3",
+        "codec_args": ["-c:a", "libmp3lame"],
+        "bitrates": ["64", "96", "128", "192"],
+        "default_bitrate": "96",
+        # No bit reservoir, so a frame never borrows bytes from a frame of another segment.
+        "segment_args": ["-reservoir", "0", "-write_xing", "0", "-id3v2_version", "0", "-f", "mp3"],
+        "segment_demuxer": "mp3",
+        "remux_args": [],
+        "frame_size": 1152,
+        # LAME's 576 samples plus the 529-sample decoder delay (MP3_DECODER_DELAY) ffmpeg reports for libmp3lame.
+        "encoder_delay": 1105,
+    },
+    "wav": {
+        "label": "WAV（无压缩）",
+        "extension": ".wav",
+        "codec_args": ["-c:a", "pcm_s16le"],
+        "bitrates": [],
+        "default_bitrate": "",
+    },
+}
+
+
+@dataclass
+class AudioInfo:
+    duration: float
+    channels: int = 0
+    sample_rate: int = 0
+    bits_per_sample: int = 0
+    origination: datetime | None = None
+    # Bytes read from the file to learn the above; 0 when ffmpeg did the reading.
+    bytes_read: int = 0
+
+
+@dataclass
+class WavHeader:
+    container: str
+    format_tag: int
+    channels: int
+    sample_rate: int
+    bits_per_sample: int
+    block_align: int
+    data_offset: int
+    data_size: int
+    fmt_chunk: bytes
+    origination: datetime | None = None
+    # Bytes read_wav_header actually read: chunk headers and the payloads it parsed, not the skipped ones.
+    header_bytes: int = 0
+
+    @property
+    def sample_format(self) -> int:
+        """Format code, resolving WAVE_FORMAT_EXTENSIBLE to its SubFormat GUID."""
+        if self.format_tag == WAVE_FORMAT_EXTENSIBLE and len(self.fmt_chunk) >= 26:
+            return struct.unpack_from("<H", self.fmt_chunk, 24)[0]
+        return self.format_tag
+
+    @property
+    def frame_count(self) -> int:
+        return self.data_size // self.block_align if self.block_align else 0
+
+    @property
+    def duration(self) -> float:
+        return self.frame_count / self.sample_rate if self.sample_rate else 0.0
+
+
+@dataclass(slots=True)
+class AudioFile:
+    path: Path
+    duration: float
+    size: int
+    start_time: datetime
+    channels: int = 0
+    sample_rate: int = 0
+    bits_per_sample: int = 0
+    # Sampled hash of the audio data (see ``content_fingerprint``); equal for copies of the same chunk.
+    fingerprint: str = ""
+    # Derived once per file: grouping compares these floats instead of building a timedelta for every pair.
+    start_epoch: float = field(init=False, repr=False, compare=False)
+    end_epoch: float = field(init=False, repr=False, compare=False)
+    end_time: datetime = field(init=False, repr=False, compare=False)
+
+    def __post_init__(self) -> None:
+        # Naive wall-clock seconds, so gaps match plain datetime subtraction even across DST changes.
+        self.start_epoch = (self.start_time.replace(tzinfo=None) - EPOCH).total_seconds()
+        self.end_epoch = self.start_epoch + self.duration
+        self.end_time = self.start_time + timedelta(seconds=self.duration)
+
+    @property
+    def display_name(self) -> str:
+        return self.path.name
+
+
+@dataclass(slots=True)
+class RecordingGroup:
+    """Files of one session in start order, with running totals of their duration and size.
+
+    Add members with ``append`` so the totals stay current; views, progress and export planning read them
+    once per row or job instead of summing every member each time.
+    """
+
+    files: list[AudioFile] = field(default_factory=list)
+    title: str = ""
+    duration: float = field(init=False, compare=False)
+    size: int = field(init=False, compare=False)
+
+    def __post_init__(self) -> None:
+        self.duration = sum(item.duration for item in self.files)
+        self.size = sum(item.size for item in self.files)
+
+    def append(self, audio_file: AudioFile) -> None:
+        self.files.append(audio_file)
+        self.duration += audio_file.duration
+        self.size += audio_file.size
+
+    @property
+    def start_time(self) -> datetime | None:
+        return self.files[0].start_time if self.files else None
+
+    @property
+    def end_time(self) -> datetime | None:
+        return self.files[-1].end_time if self.files else None
+
+
+def read_wav_header(path: Path) -> WavHeader:
+    """Parse RIFF/RF64/BW64 chunk headers (fmt, ds64, bext, data) without reading audio.
+
+    Raises ValueError when the file is not a WAV this parser understands.
+    """
+    with path.open("rb") as handle:
+        file_size = os.fstat(handle.fileno()).st_size
+        riff = handle.read(12)
+        if len(riff) < 12 or riff[8:12] != b"WAVE" or riff[:4] not in (b"RIFF", b"RF64", b"BW64"):
+            raise ValueError("not a RIFF/WAVE file")
+        container = riff[:4].decode("ascii")
+
+        fmt_chunk: bytes | None = None
+        ds64_data_size: int | None = None
+        origination: datetime | None = None
+        position = 12
+        bytes_read = 12
+        while position + 8 <= file_size:
+            handle.seek(position)
+            chunk_id, chunk_size = struct.unpack("<4sI", handle.read(8))
+            payload_offset = position + 8
+            bytes_read += 8
+
+            if chunk_id == b"data":
+                if fmt_chunk is None:
+                    raise ValueError("data chunk before fmt chunk")
+                if chunk_size == RIFF_SIZE_PLACEHOLDER and ds64_data_size is not None:
+                    chunk_size = ds64_data_size
+                remaining = file_size - payload_offset
+                # Unfinalized recordings leave the size at 0 or the placeholder; trust the file length instead.
+                if chunk_size == 0 or chunk_size > remaining:
+                    chunk_size = remaining
+                header = build_wav_header(container, fmt_chunk, payload_offset, chunk_size, origination)
+                header.header_bytes = bytes_read
+                return header
+
+            if chunk_id in (b"fmt ", b"ds64", b"bext") and chunk_size <= HEADER_CHUNK_LIMIT:
+                payload = handle.read(chunk_size)
+                bytes_read += len(payload)
+                if chunk_id == b"fmt ":
+                    fmt_chunk = payload
+                elif chunk_id == b"ds64" and len(payload) >= 16:
+                    ds64_data_size = struct.unpack_from("<Q", payload, 8)[0]
+                elif chunk_id == b"bext":
+                    origination = parse_bext_origination(payload)
+
+            position = payload_offset + chunk_size + (chunk_size & 1)
+
+    raise ValueError("no data chunk")
+
+
+def build_wav_header(
+    container: str,
+    fmt_chunk: bytes,
+    data_offset: int,
+    data_size: int,
+    origination: datetime | None,
+) -> WavHeader:
+    if len(fmt_chunk) < 16:
+        raise ValueError("fmt chunk too short")
+    format_tag, channels, sample_rate, _byte_rate, block_align, bits_per_sample = struct.unpack_from(
+        "<HHIIHH", fmt_chunk
+    )
+    if channels <= 0 or sample_rate <= 0:
+        raise ValueError("invalid fmt chunk")
+    if not block_align:
+        block_align = channels * ((bits_per_sample + 7) // 8)
+    return WavHeader(
+        container=container,
+        format_tag=format_tag,
+        channels=channels,
+        sample_rate=sample_rate,
+        bits_per_sample=bits_per_sample,
+        block_align=block_align,
+        data_offset=data_offset,
+        data_size=data_size,
+        fmt_chunk=fmt_chunk,
+        origination=origination,
+    )
+
+
+def parse_bext_origination(payload: bytes) -> datetime | None:
+    # bext layout: Description[256], Originator[32], OriginatorReference[32], OriginationDate[10], OriginationTime[8].
+    if len(payload) < 338:
+        return None
+    text = payload[320:338].decode("ascii", errors="ignore")
+    digits = re.sub(r"\D", "", text)
+    if len(digits) != 14:
+        return None
+    try:
+        return datetime.strptime(digits, "%Y%m%d%H%M%S")
+    except ValueError:
+        return None
+
+
+def headers_share_format(headers: list[WavHeader]) -> bool:
+    """True when every header describes the same PCM/float layout, so data chunks can be joined byte for byte."""
+    if not headers:
+        return False
+    first = headers[0]
+    if first.sample_format not in (WAVE_FORMAT_PCM, WAVE_FORMAT_IEEE_FLOAT):
+        return False
+    layout = (first.sample_format, first.channels, first.sample_rate, first.bits_per_sample, first.block_align)
+    return all(
+        (item.sample_format, item.channels, item.sample_rate, item.bits_per_sample, item.block_align) == layout
+        for item in headers
+    )
+
+
+def write_wav_header(handle: BinaryIO, fmt_chunk: bytes, data_size: int) -> None:
+    """Write a RIFF header, or an RF64 header with a ds64 chunk when the data exceeds 4 GiB."""
+    fmt_padded = fmt_chunk + (b"\0" if len(fmt_chunk) & 1 else b"")
+    pad = data_size & 1
+    riff_size = 4 + 8 + len(fmt_padded) + 8 + data_size + pad
+    if riff_size < RIFF_SIZE_PLACEHOLDER:
+        handle.write(struct.pack("<4sI4s", b"RIFF", riff_size, b"WAVE"))
+        handle.write(struct.pack("<4sI", b"fmt ", len(fmt_chunk)) + fmt_padded)
+        handle.write(struct.pack("<4sI", b"data", data_size))
+        return
+
+    block_align = struct.unpack_from("<H", fmt_chunk, 12)[0]
+    ds64 = struct.pack("<QQQI", riff_size + 8 + 28, data_size, data_size // block_align if block_align else 0, 0)
+    handle.write(struct.pack("<4sI4s", b"RF64", RIFF_SIZE_PLACEHOLDER, b"WAVE"))
+    handle.write(struct.pack("<4sI", b"ds64", len(ds64)) + ds64)
+    handle.write(struct.pack("<4sI", b"fmt ", len(fmt_chunk)) + fmt_padded)
+    handle.write(struct.pack("<4sI", b"data", RIFF_SIZE_PLACEHOLDER))
+
+
+def content_fingerprint(path: Path) -> tuple[str, int]:
+    """Hash the format, the data size and a few blocks spread evenly over the audio data.
+
+    Reads ``FINGERPRINT_BLOCKS`` blocks however long the file is. Metadata chunks are left out, so a copy
+    whose ``bext`` or ``LIST`` chunk was rewritten still matches. Files that are not parseable WAVs are
+    sampled over their whole length. Returns the digest and the number of bytes read.
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    bytes_read = 0
+    try:
+        header = read_wav_header(path)
+        start, size = header.data_offset, header.data_size
+        digest.update(header.fmt_chunk)
+        bytes_read += header.header_bytes
+    except ValueError:
+        start, size = 0, path.stat().st_size
+    digest.update(size.to_bytes(8, "little"))
+    span = max(0, size - FINGERPRINT_BLOCK_SIZE)
+    offsets = sorted({start + span * index // max(1, FINGERPRINT_BLOCKS - 1) for index in range(FINGERPRINT_BLOCKS)})
+    with path.open("rb") as handle:
+        for offset in offsets:
+            handle.seek(offset)
+            block = handle.read(min(FINGERPRINT_BLOCK_SIZE, size))
+            digest.update(block)
+            bytes_read += len(block)
+    return digest.hexdigest(), bytes_read
+
+
+def copy_file_data(
+    source: Path,
+    offset: int,
+    count: int,
+    destination: BinaryIO,
+    on_copied: Callable[[int], None],
+) -> int:
+    """Append ``count`` bytes of ``source`` starting at ``offset`` to the unbuffered ``destination``.
+
+    Uses copy_file_range or sendfile so the kernel moves the bytes, and falls back to mmap where neither works.
+    """
+    copied = 0
+    with source.open("rb") as handle:
+        source_fd = handle.fileno()
+        destination_fd = destination.fileno()
+        for kernel_copy in (copy_with_copy_file_range, copy_with_sendfile):
+            try:
+                while copied < count:
+                    moved = kernel_copy(source_fd, destination_fd, offset + copied, min(COPY_CHUNK_SIZE, count - copied))
+                    if moved <= 0:
+                        break
+                    copied += moved
+                    on_copied(moved)
+                if copied >= count:
+                    return copied
+            except (AttributeError, OSError):
+                continue
+
+        with mmap.mmap(source_fd, 0, access=mmap.ACCESS_READ) as mapped:
+            end = min(offset + count, len(mapped))
+            with memoryview(mapped) as view:
+                while offset + copied < end:
+                    chunk = view[offset + copied : min(end, offset + copied + COPY_CHUNK_SIZE)]
+                    destination.write(chunk)
+                    copied += len(chunk)
+                    on_copied(len(chunk))
+                    chunk.release()
+    return copied
+
+
+def copy_with_copy_file_range(source_fd: int, destination_fd: int, offset: int, count: int) -> int:
+    return os.copy_file_range(source_fd, destination_fd, count, offset)
+
+
+def copy_with_sendfile(source_fd: int, destination_fd: int, offset: int, count: int) -> int:
+    # macOS only accepts sockets as the sendfile target; the mmap path covers it.
+    if not sys.platform.startswith("linux"):
+        raise OSError("sendfile to regular files is not supported here")
+    return os.sendfile(destination_fd, source_fd, offset, count)
+
+
+class ScanCache:
+    """SQLite index of probed WAV metadata and silence spans, keyed by path, size and mtime."""
+
+    SCHEMA_VERSION = 4
+
+    def __init__(self, path: Path = SCAN_CACHE_PATH) -> None:
+        self.path = path
+        self.lock = threading.Lock()
+        self.connection: sqlite3.Connection | None = None
+        try:
+            self.connection = sqlite3.connect(str(path), check_same_thread=False)
+            self.prepare_schema()
+        except sqlite3.Error:
+            self.connection = None
+
+    def prepare_schema(self) -> None:
+        assert self.connection is not None
+        version = self.connection.execute("PRAGMA user_version").fetchone()[0]
+        if version != self.SCHEMA_VERSION:
+            self.connection.execute("DROP TABLE IF EXISTS files")
+            self.connection.execute("DROP TABLE IF EXISTS silence")
+        self.connection.execute(
+            """
+            CREATE TABLE IF NOT EXISTS silence (
+                path TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                mtime_ns INTEGER NOT NULL,
+                threshold_db REAL NOT NULL,
+                spans TEXT NOT NULL,
+                PRIMARY KEY (path, threshold_db)
+            )
+            """
+        )
+        self.connection.execute(
+            """
+            CREATE TABLE IF NOT EXISTS files (
+                path TEXT PRIMARY KEY,
+                size INTEGER NOT NULL,
+                mtime_ns INTEGER NOT NULL,
+                duration REAL NOT NULL,
+                start_time TEXT NOT NULL,
+                channels INTEGER NOT NULL,
+                sample_rate INTEGER NOT NULL,
+                bits_per_sample INTEGER NOT NULL,
+                fingerprint TEXT NOT NULL
+            )
+            """
+        )
+        self.connection.execute(f"PRAGMA user_version = {self.SCHEMA_VERSION}")
+        self.connection.commit()
+
+    @staticmethod
+    def key(path: Path) -> str:
+        return os.path.abspath(path)
+
+    def lookup(self, path: Path, stat: os.stat_result) -> AudioFile | None:
+        if self.connection is None:
+            return None
+        try:
+            with self.lock:
+                row = self.connection.execute(
+                    "SELECT duration, start_time, channels, sample_rate, bits_per_sample, fingerprint "
+                    "FROM files WHERE path = ? AND size = ? AND mtime_ns = ?",
+                    (self.key(path), stat.st_size, stat.st_mtime_ns),
+                ).fetchone()
+        except sqlite3.Error:
+            return None
+        if row is None:
+            return None
+        duration, start_time, channels, sample_rate, bits_per_sample, fingerprint = row
+        return AudioFile(
+            path=path,
+            duration=duration,
+            size=stat.st_size,
+            start_time=datetime.fromisoformat(start_time),
+            channels=channels,
+            sample_rate=sample_rate,
+            bits_per_sample=bits_per_sample,
+            fingerprint=fingerprint,
+        )
+
+    def store(self, entries: list[tuple[AudioFile, os.stat_result]]) -> None:
+        if self.connection is None or not entries:
+            return
+        rows = [
+            (
+                self.key(audio_file.path),
+                stat.st_size,
+                stat.st_mtime_ns,
+                audio_file.duration,
+                audio_file.start_time.isoformat(),
+                audio_file.channels,
+                audio_file.sample_rate,
+                audio_file.bits_per_sample,
+                audio_file.fingerprint,
+            )
+            for audio_file, stat in entries
+        ]
+        try:
+            with self.lock, self.connection:
+                self.connection.executemany("INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", rows)
+        except sqlite3.Error:
+            pass
+
+    def lookup_spans(self, path: Path, stat: os.stat_result, threshold_db: float) -> list[tuple[float, float]] | None:
+        if self.connection is None:
+            return None
+        try:
+            with self.lock:
+                row = self.connection.execute(
+                    "SELECT spans FROM silence WHERE path = ? AND size = ? AND mtime_ns = ? AND threshold_db = ?",
+                    (self.key(path), stat.st_size, stat.st_mtime_ns, threshold_db),
+                ).fetchone()
+        except sqlite3.Error:
+            return None
+        return [(start, end) for start, end in json.loads(row[0])] if row else None
+
+    def store_spans(
+        self,
+        path: Path,
+        stat: os.stat_result,
+        threshold_db: float,
+        spans: list[tuple[float, float]],
+    ) -> None:
+        if self.connection is None:
+            return
+        try:
+            with self.lock, self.connection:
+                self.connection.execute(
+                    "INSERT OR REPLACE INTO silence VALUES (?, ?, ?, ?, ?)",
+                    (self.key(path), stat.st_size, stat.st_mtime_ns, threshold_db, json.dumps(spans)),
+                )
+        except sqlite3.Error:
+            pass
+
+    def prune(self, folder: Path, seen: set[Path], recursive: bool) -> int:
+        """Evict entries under ``folder`` whose files were not found by the latest scan."""
+        if self.connection is None:
+            return 0
+        prefix = os.path.join(self.key(folder), "")
+        seen_keys = {self.key(path) for path in seen}
+        try:
+            with self.lock:
+                rows = self.connection.execute(
+                    "SELECT path FROM files WHERE substr(path, 1, ?) = ?",
+                    (len(prefix), prefix),
+                ).fetchall()
+                stale = [
+                    (path,)
+                    for (path,) in rows
+                    if path not in seen_keys and (recursive or os.path.dirname(path) == prefix.rstrip(os.sep))
+                ]
+                with self.connection:
+                    self.connection.executemany("DELETE FROM files WHERE path = ?", stale)
+                    self.connection.executemany("DELETE FROM silence WHERE path = ?", stale)
+        except sqlite3.Error:
+            return 0
+        return len(stale)
+
+    def clear(self) -> None:
+        if self.connection is None:
+            return
+        try:
+            with self.lock, self.connection:
+                self.connection.execute("DELETE FROM files")
+                self.connection.execute("DELETE FROM silence")
+        except sqlite3.Error:
+            pass
+
+    def close(self) -> None:
+        if self.connection is not None:
+            self.connection.close()
+
+
+class ExportCache:
+    """Content-addressed store of finished exports, keyed by ``session_fingerprint``.
+
+    Outputs are copied in and out rather than hard-linked, so editing an exported file in place never
+    reaches the stored one. A SQLite manifest tracks size, modification time and last use; an entry whose
+    file no longer matches is dropped, and the store is trimmed to ``limit`` bytes, least recently used first.
+    """
+
+    SCHEMA_VERSION = 2
+
+    def __init__(self, folder: Path = EXPORT_CACHE_DIR, limit: int = EXPORT_CACHE_LIMIT) -> None:
+        self.folder = folder
+        self.limit = limit
+        self.lock = threading.Lock()
+        self.connection: sqlite3.Connection | None = None
+        try:
+            folder.mkdir(parents=True, exist_ok=True)
+            self.connection = sqlite3.connect(str(folder / "manifest.sqlite3"), check_same_thread=False)
+            self.prepare_schema()
+        except (OSError, sqlite3.Error):
+            self.connection = None
+
+    def prepare_schema(self) -> None:
+        assert self.connection is not None
+        version = self.connection.execute("PRAGMA user_version").fetchone()[0]
+        if version != self.SCHEMA_VERSION:
+            self.connection.execute("DROP TABLE IF EXISTS outputs")
+        self.connection.execute(
+            """
+            CREATE TABLE IF NOT EXISTS outputs (
+                fingerprint TEXT PRIMARY KEY,
+                name TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                mtime_ns INTEGER NOT NULL,
+                last_used REAL NOT NULL
+            )
+            """
+        )
+        self.connection.execute(f"PRAGMA user_version = {self.SCHEMA_VERSION}")
+        self.connection.commit()
+
+    def fetch(self, fingerprint: str, target: Path) -> bool:
+        """Place the stored output for ``fingerprint`` at ``target``; False when there is none to reuse."""
+        if self.connection is None:
+            return False
+        try:
+            with self.lock:
+                row = self.connection.execute(
+                    "SELECT name, size, mtime_ns FROM outputs WHERE fingerprint = ?", (fingerprint,)
+                ).fetchone()
+        except sqlite3.Error:
+            return False
+        if row is None:
+            return False
+        name, size, mtime_ns = row
+        stored = self.folder / name
+        try:
+            if not self.unchanged(stored, size, mtime_ns):
+                raise OSError("stored output changed")
+            shutil.copyfile(stored, target)
+        except OSError:
+            self.forget(fingerprint)
+            return False
+        self.touch(fingerprint)
+        return True
+
+    def contains(self, fingerprint: str) -> bool:
+        """Whether ``fetch`` is expected to succeed, without placing anything."""
+        if self.connection is None:
+            return False
+        try:
+            with self.lock:
+                row = self.connection.execute(
+                    "SELECT name, size, mtime_ns FROM outputs WHERE fingerprint = ?", (fingerprint,)
+                ).fetchone()
+        except sqlite3.Error:
+            return False
+        return row is not None and self.unchanged(self.folder / row[0], row[1], row[2])
+
+    @staticmethod
+    def unchanged(stored: Path, size: int, mtime_ns: int) -> bool:
+        try:
+            stat = stored.stat()
+        except OSError:
+            return False
+        return stat.st_size == size and stat.st_mtime_ns == mtime_ns
+
+    def store(self, fingerprint: str, output_path: Path) -> None:
+        if self.connection is None:
+            return
+        stored = self.folder / (fingerprint + output_path.suffix)
+        try:
+            stored.unlink(missing_ok=True)
+            shutil.copyfile(output_path, stored)
+            stat = stored.stat()
+            with self.lock, self.connection:
+                self.connection.execute(
+                    "INSERT OR REPLACE INTO outputs VALUES (?, ?, ?, ?, ?)",
+                    (fingerprint, stored.name, stat.st_size, stat.st_mtime_ns, time.time()),
+                )
+        except (OSError, sqlite3.Error):
+            return
+        self.evict()
+
+    def touch(self, fingerprint: str) -> None:
+        assert self.connection is not None
+        try:
+            with self.lock, self.connection:
+                self.connection.execute(
+                    "UPDATE outputs SET last_used = ? WHERE fingerprint = ?", (time.time(), fingerprint)
+                )
+        except sqlite3.Error:
+            pass
+
+    def forget(self, fingerprint: str) -> None:
+        assert self.connection is not None
+        try:
+            with self.lock, self.connection:
+                row = self.connection.execute(
+                    "SELECT name FROM outputs WHERE fingerprint = ?", (fingerprint,)
+                ).fetchone()
+                self.connection.execute("DELETE FROM outputs WHERE fingerprint = ?", (fingerprint,))
+        except sqlite3.Error:
+            return
+        if row is not None:
+            try:
+                (self.folder / row[0]).unlink(missing_ok=True)
+            except OSError:
+                # The manifest no longer lists it; a leftover file is only wasted space.
+                pass
+
+    def evict(self) -> int:
+        """Drop least recently used outputs until the store fits in ``limit`` bytes."""
+        if self.connection is None:
+            return 0
+        try:
+            with self.lock:
+                rows = self.connection.execute(
+                    "SELECT fingerprint, name, size FROM outputs ORDER BY last_used DESC"
+                ).fetchall()
+        except sqlite3.Error:
+            return 0
+        total = 0
+        evicted = 0
+        for fingerprint, _name, size in rows:
+            total += size
+            if total > self.limit:
+                self.forget(fingerprint)
+                evicted += 1
+        return evicted
+
+    def close(self) -> None:
+        if self.connection is not None:
+            self.connection.close()
+            self.connection = None
+
+
+class PeakCache:
+    """SQLite side cache of per-file waveform peaks (the pyramid's level 0), keyed by path, size and mtime."""
+
+    SCHEMA_VERSION = 1
+
+    def __init__(self, path: Path = PEAK_CACHE_PATH) -> None:
+        self.path = path
+        self.lock = threading.Lock()
+        self.connection: sqlite3.Connection | None = None
+        try:
+            self.connection = sqlite3.connect(str(path), check_same_thread=False)
+            self.prepare_schema()
+        except sqlite3.Error:
+            self.connection = None
+
+    def prepare_schema(self) -> None:
+        assert self.connection is not None
+        version = self.connection.execute("PRAGMA user_version").fetchone()[0]
+        if version != self.SCHEMA_VERSION:
+            self.connection.execute("DROP TABLE IF EXISTS peaks")
+        self.connection.execute(
+            """
+            CREATE TABLE IF NOT EXISTS peaks (
+                path TEXT PRIMARY KEY,
+                size INTEGER NOT NULL,
+                mtime_ns INTEGER NOT NULL,
+                peaks BLOB NOT NULL
+            )
+            """
+        )
+        self.connection.execute(f"PRAGMA user_version = {self.SCHEMA_VERSION}")
+        self.connection.commit()
+
+    def lookup(self, path: Path, stat: os.stat_result) -> "np.ndarray | None":
+        if self.connection is None:
+            return None
+        try:
+            with self.lock:
+                row = self.connection.execute(
+                    "SELECT peaks FROM peaks WHERE path = ? AND size = ? AND mtime_ns = ?",
+                    (ScanCache.key(path), stat.st_size, stat.st_mtime_ns),
+                ).fetchone()
+        except sqlite3.Error:
+            return None
+        return np.frombuffer(row[0], dtype=np.int8).reshape(-1, 2) if row else None
+
+    def store(self, path: Path, stat: os.stat_result, peaks: "np.ndarray") -> None:
+        if self.connection is None:
+            return
+        try:
+            with self.lock, self.connection:
+                self.connection.execute(
+                    "INSERT OR REPLACE INTO peaks VALUES (?, ?, ?, ?)",
+                    (ScanCache.key(path), stat.st_size, stat.st_mtime_ns, peaks.tobytes()),
+                )
+        except sqlite3.Error:
+            pass
+
+    def close(self) -> None:
+        if self.connection is not None:
+            self.connection.close()
+            self.connection = None
+
+
+class Waveform:
+    """Min/max peak pyramid of a joined session, for drawing any stretch of it at any zoom.
+
+    Level 0 holds one int8 (min, max) pair per PEAK_BUCKET_SECONDS; every level above folds
+    PEAK_LEVEL_FACTOR buckets of the one below, so a redraw reads only a few buckets per pixel column.
+    """
+
+    def __init__(self, chunks: list["np.ndarray"], offsets: list[float]) -> None:
+        self.offsets = offsets
+        self.levels = [np.concatenate(chunks) if chunks else np.zeros((0, 2), dtype=np.int8)]
+        while len(self.levels[-1]) > PEAK_LEVEL_FACTOR:
+            level = self.levels[-1]
+            starts = np.arange(0, len(level), PEAK_LEVEL_FACTOR)
+            self.levels.append(
+                np.stack([np.minimum.reduceat(level[:, 0], starts), np.maximum.reduceat(level[:, 1], starts)], axis=1)
+            )
+
+    @property
+    def duration(self) -> float:
+        return len(self.levels[0]) * PEAK_BUCKET_SECONDS
+
+    def columns(self, start: float, end: float, count: int) -> "np.ndarray":
+        """Return ``count`` (min, max) pairs in -1..1 covering ``start``..``end`` seconds; NaN past either end."""
+        count = max(1, count)
+        per_column = max(end - start, PEAK_BUCKET_SECONDS) / PEAK_BUCKET_SECONDS / count
+        depth = 0
+        while depth + 1 < len(self.levels) and PEAK_LEVEL_FACTOR ** (depth + 1) <= per_column:
+            depth += 1
+        level = self.levels[depth]
+        bucket = PEAK_BUCKET_SECONDS * PEAK_LEVEL_FACTOR**depth
+
+        edges = np.floor(np.linspace(start / bucket, end / bucket, count + 1)).astype(np.int64)
+        starts = edges[:-1]
+        # The right edge rounds up, so a bucket only partly inside the view still reaches the last column.
+        stop = int(np.ceil(end / bucket))
+        valid = (starts >= 0) & (starts < len(level))
+        result = np.full((count, 2), np.nan)
+        if valid.any():
+            # reduceat folds each start up to the next one; the last column stops at its own right edge.
+            indices = starts[valid]
+            window = level[: min(len(level), max(stop, int(indices[-1]) + 1))]
+            result[valid, 0] = np.minimum.reduceat(window[:, 0], indices) / 127
+            result[valid, 1] = np.maximum.reduceat(window[:, 1], indices) / 127
+        return result
+
+
+@dataclass
+class ExportSettings:
+    format: str = "m4a"
+    bitrate: str = "64"
+    mix_to_mono: bool = True
+    sample_rate: int = 48000
+    # Dead-air trimming: silent stretches of at least min_silence_seconds are shortened to keep_silence_seconds.
+    trim_silence: bool = False
+    silence_threshold_db: float = -45.0
+    min_silence_seconds: float = 10.0
+    keep_silence_seconds: float = 1.0
+    # Further formats written from the same decode, each at its preset's default bitrate.
+    extra_formats: tuple[str, ...] = ()
+
+    @property
+    def preset(self) -> dict:
+        return FORMAT_PRESETS[self.format]
+
+    def variants(self) -> list["ExportSettings"]:
+        """Single-format settings for every output of a session, this format first."""
+        variants = [replace(self, extra_formats=())]
+        for name in dict.fromkeys(self.extra_formats):
+            if name != self.format:
+                variants.append(
+                    replace(self, format=name, bitrate=FORMAT_PRESETS[name]["default_bitrate"], extra_formats=())
+                )
+        return variants
+
+
+@dataclass
+class ExportResult:
+    outputs: list[Path] = field(default_factory=list)
+    deleted_paths: list[Path] = field(default_factory=list)
+    failures: list[str] = field(default_factory=list)
+    # Sources of the sessions that exported successfully.
+    source_paths: list[Path] = field(default_factory=list)
+    # Outputs a resumed export found already complete and did not write again.
+    resumed: list[Path] = field(default_factory=list)
+
+
+@dataclass
+class StageStats:
+    calls: int = 0
+    seconds: float = 0.0
+    items: int = 0
+    bytes_read: int = 0
+    bytes_written: int = 0
+
+
+@dataclass
+class SessionStats:
+    name: str
+    method: str
+    media_seconds: float
+    seconds: float
+    bytes_read: int
+    bytes_written: int
+    # Last ``speed=`` value ffmpeg reported; None for lossless WAV copies.
+    ffmpeg_speed: float | None = None
+
+    @property
+    def realtime_factor(self) -> float | None:
+        return self.media_seconds / self.seconds if self.seconds > 0 else None
+
+
+class RunStats:
+    """Thread-safe per-stage timings for one scan or export run.
+
+    Stage times add up across worker threads, so a parallel stage can report more seconds than the wall clock.
+    With ``max_sessions``, only that many recent per-session rows are kept; the totals still cover every session.
+    """
+
+    CSV_FIELDS = (
+        "kind",
+        "name",
+        "calls",
+        "seconds",
+        "items",
+        "bytes_read",
+        "bytes_written",
+        "media_seconds",
+        "realtime_factor",
+        "ffmpeg_speed",
+    )
+
+    def __init__(self, max_sessions: int | None = None) -> None:
+        self.lock = threading.Lock()
+        self.started = datetime.now()
+        self.stages: dict[str, StageStats] = {}
+        self.sessions: deque[SessionStats] = deque(maxlen=max_sessions)
+        self.session_count = 0
+        self.media_seconds = 0.0
+        self.busy_seconds = 0.0
+
+    def add(self, stage: str, seconds: float, items: int = 0, bytes_read: int = 0, bytes_written: int = 0) -> None:
+        with self.lock:
+            stats = self.stages.setdefault(stage, StageStats())
+            stats.calls += 1
+            stats.seconds += seconds
+            stats.items += items
+            stats.bytes_read += bytes_read
+            stats.bytes_written += bytes_written
+
+    def bytes_read(self, *stages: str) -> int:
+        """Bytes the given stages have read so far."""
+        with self.lock:
+            return sum(self.stages[stage].bytes_read for stage in stages if stage in self.stages)
+
+    @contextmanager
+    def measure(self, stage: str, items: int = 0, bytes_read: int = 0) -> Iterator[None]:
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(stage, time.perf_counter() - started, items=items, bytes_read=bytes_read)
+
+    def add_session(self, session: SessionStats) -> None:
+        with self.lock:
+            self.sessions.append(session)
+            self.session_count += 1
+            self.media_seconds += session.media_seconds
+            self.busy_seconds += session.seconds
+        self.add("export_group", session.seconds, 1, session.bytes_read, session.bytes_written)
+
+    def summary(self) -> str:
+        """One line for the status panel, slowest stage first."""
+        with self.lock:
+            stages = sorted(self.stages.items(), key=lambda item: item[1].seconds, reverse=True)
+            media, busy = self.media_seconds, self.busy_seconds
+        parts = [f"{name} {stats.seconds:.2f}s" for name, stats in stages if stats.seconds]
+        if "cache_hit" in self.stages:
+            parts.append(f"缓存命中 {self.stages['cache_hit'].items} 个")
+        if media and busy:
+            parts.append(f"实时倍数 {media / busy:.1f}x")
+        return "耗时：" + "，".join(parts) if parts else ""
+
+    def to_json(self) -> dict:
+        with self.lock:
+            return {
+                "started": self.started.isoformat(timespec="seconds"),
+                "stages": {name: vars(stats).copy() for name, stats in self.stages.items()},
+                "session_count": self.session_count,
+                "sessions": [
+                    {**vars(session), "realtime_factor": session.realtime_factor} for session in self.sessions
+                ],
+            }
+
+    def write_log(self, path: Path) -> None:
+        """Write the run as JSON, or as CSV with one row per stage and per session when ``path`` ends in .csv."""
+        data = self.to_json()
+        if path.suffix.lower() != ".csv":
+            path.write_text(json.dumps(data, ensure_ascii=False, indent=2) + "\n", encoding="utf-8")
+            return
+        with path.open("w", encoding="utf-8", newline="") as output:
+            writer = csv.DictWriter(output, fieldnames=self.CSV_FIELDS, extrasaction="ignore")
+            writer.writeheader()
+            for name, stats in data["stages"].items():
+                writer.writerow({"kind": "stage", "name": name, **stats})
+            for session in data["sessions"]:
+                writer.writerow({"kind": "session", "calls": 1, **session})
+
+
+def load_config() -> dict:
+    if not CONFIG_PATH.exists():
+        return {}
+    try:
+        return json.loads(CONFIG_PATH.read_text(encoding="utf-8"))
+    except (OSError, json.JSONDecodeError):
+        return {}
+
+
+def save_config(data: dict) -> None:
+    try:
+        CONFIG_PATH.write_text(json.dumps(data, ensure_ascii=False, indent=2), encoding="utf-8")
+    except OSError:
+        pass
+
+
+def locate_ffmpeg() -> str | None:
+    try:
+        import imageio_ffmpeg
+
+        return imageio_ffmpeg.get_ffmpeg_exe()
+    except Exception:
+        return shutil.which("ffmpeg")
+
+
+def find_wav_files(
+    folder: Path,
+    recursive: bool,
+    skip: Iterable[Path] = (),
+    ignore: Iterable[str] = DEFAULT_SCAN_IGNORE,
+) -> list[Path]:
+    return sorted(path for batch in iter_wav_files(folder, recursive, skip, ignore) for path in batch)
+
+
+def iter_wav_files(
+    folder: Path,
+    recursive: bool,
+    skip: Iterable[Path] = (),
+    ignore: Iterable[str] = DEFAULT_SCAN_IGNORE,
+    cancel_event: threading.Event | None = None,
+    workers: int = SCAN_WORKERS,
+) -> Iterator[list[Path]]:
+    """Walk ``folder`` with os.scandir and yield the WAV files of each directory as soon as it is listed.
+
+    Names are matched on their extension before anything else, and the entry's cached file type answers
+    is_file/is_dir, so the walk itself costs no stat() per file. Directories in ``skip`` (such as the output
+    folder), hidden ones and those matching an ``ignore`` glob are not entered. Subdirectories are listed in
+    parallel, so batches arrive in no particular order.
+    """
+    skipped = {os.path.abspath(path) for path in skip}
+    patterns = [pattern.lower() for pattern in ignore]
+
+    def list_directory(directory: str) -> tuple[list[Path], list[str]]:
+        files: list[Path] = []
+        children: list[str] = []
+        try:
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    try:
+                        if os.path.splitext(entry.name)[1].lower() in SUPPORTED_EXTENSIONS and entry.is_file():
+                            files.append(Path(entry.path))
+                        elif (
+                            recursive
+                            and entry.is_dir(follow_symlinks=False)
+                            and not is_ignored_directory(entry.name, entry.path, skipped, patterns)
+                        ):
+                            children.append(entry.path)
+                    except OSError:
+                        continue
+        except OSError:
+            pass
+        return files, children
+
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        pending = {pool.submit(list_directory, os.fspath(folder))}
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                files, children = future.result()
+                if cancel_event is None or not cancel_event.is_set():
+                    pending.update(pool.submit(list_directory, child) for child in children)
+                if files:
+                    yield files
+
+
+def is_ignored_directory(name: str, path: str, skipped: set[str], patterns: list[str]) -> bool:
+    if name.startswith("."):
+        return True
+    lowered = name.lower()
+    return any(fnmatch.fnmatchcase(lowered, pattern) for pattern in patterns) or os.path.abspath(path) in skipped
+
+
+def extract_start_time(path: Path, fallback_timestamp: float, origination: datetime | None = None) -> datetime:
+    name = path.stem
+    compact_match = re.search(r"(20\d{12})", name)
+    if compact_match:
+        try:
+            return datetime.strptime(compact_match.group(1), "%Y%m%d%H%M%S")
+        except ValueError:
+            pass
+
+    separated_match = re.search(
+        r"(20\d{2})[-_. ]?(\d{2})[-_. ]?(\d{2})[-_ T]?(\d{2})[-_. ]?(\d{2})[-_. ]?(\d{2})",
+        name,
+    )
+    if separated_match:
+        try:
+            return datetime(
+                int(separated_match.group(1)),
+                int(separated_match.group(2)),
+                int(separated_match.group(3)),
+                int(separated_match.group(4)),
+                int(separated_match.group(5)),
+                int(separated_match.group(6)),
+            )
+        except ValueError:
+            pass
+
+    if origination is not None:
+        return origination
+    return datetime.fromtimestamp(fallback_timestamp)
+
+
+def file_sort_key(audio_file: AudioFile) -> tuple[datetime, str]:
+    return (audio_file.start_time, audio_file.path.name)
+
+
+def split_sessions(sorted_files: list[AudioFile], threshold_seconds: float) -> list[RecordingGroup]:
+    """Split already sorted files wherever the gap to the previous file exceeds the threshold."""
+    groups: list[RecordingGroup] = []
+    current: RecordingGroup | None = None
+    previous_end = 0.0
+
+    for audio_file in sorted_files:
+        if current is None or audio_file.start_epoch - previous_end > threshold_seconds:
+            current = RecordingGroup()
+            groups.append(current)
+        current.append(audio_file)
+        previous_end = audio_file.end_epoch
+    return groups
+
+
+def regroup_files(audio_files: list[AudioFile], threshold_minutes: float) -> list[RecordingGroup]:
+    """Sort files by start time and group them into titled sessions."""
+    groups = split_sessions(sorted(audio_files, key=file_sort_key), threshold_minutes * 60)
+    title_groups(groups)
+    return groups
+
+
+def title_groups(groups: list[RecordingGroup]) -> None:
+    for index, group in enumerate(groups, start=1):
+        if group.start_time:
+            group.title = f"{group.start_time:%Y-%m-%d_%H-%M-%S}_session-{index:02d}"
+        else:
+            group.title = f"session-{index:02d}"
+
+
+class GapIndex:
+    """Sorted gaps between consecutive files, for previewing how a threshold would group them.
+
+    Splitting wherever a gap exceeds T gives one session per such gap plus one, so any threshold is
+    answered with a single bisect instead of a regroup.
+    """
+
+    def __init__(self, audio_files: list[AudioFile]) -> None:
+        ordered = sorted(audio_files, key=file_sort_key)
+        self.file_count = len(ordered)
+        self.gaps = sorted(item.start_epoch - previous.end_epoch for previous, item in zip(ordered, ordered[1:]))
+
+    def session_count(self, threshold_seconds: float) -> int:
+        if not self.file_count:
+            return 0
+        return 1 + len(self.gaps) - bisect_right(self.gaps, threshold_seconds)
+
+    def histogram(self, edges: list[float]) -> list[int]:
+        """Number of gaps in each ``[edges[i], edges[i + 1])`` bin.
+
+        Negative gaps (overlapping recordings) never split a session and are counted in the first bin,
+        so the bins always add up to every gap ``session_count`` sees.
+        """
+        positions = [0] + [bisect_left(self.gaps, edge) for edge in edges[1:]]
+        return [end - start for start, end in zip(positions, positions[1:])]
+
+
+@dataclass
+class GroupSplice:
+    """``groups[index:index + removed]`` was replaced by ``inserted`` new groups."""
+
+    index: int
+    removed: int
+    inserted: int
+
+
+class SessionIndex:
+    """Sessions kept in start order and updated locally as files come and go.
+
+    A session boundary only depends on the gap between two neighbouring files, so adding or removing a
+    file can only merge or split the session it touches and the one after it. Each change is reported as
+    a GroupSplice so views can update just those rows.
+
+    Sessions the user merged or split by hand are pinned: later additions and removals may grow or shrink
+    them, but never re-derive their boundaries from gaps. Only ``rebuild`` (a full regroup) drops the pins.
+    """
+
+    def __init__(self, threshold_minutes: float = 2.0) -> None:
+        self.threshold_seconds = max(0.0, threshold_minutes) * 60
+        self.groups: list[RecordingGroup] = []
+        # Sort key of each group's first file, for bisecting a file to its session.
+        self.group_keys: list[tuple[datetime, str]] = []
+        self.file_count = 0
+        self.gap_index: GapIndex | None = None
+        # id() of each pinned group in ``groups``.
+        self.pinned: set[int] = set()
+
+    def rebuild(self, audio_files: list[AudioFile], threshold_minutes: float | None = None) -> list[GroupSplice]:
+        if threshold_minutes is not None:
+            self.threshold_seconds = max(0.0, threshold_minutes) * 60
+        removed = len(self.groups)
+        self.pinned.clear()
+        self.groups[:] = split_sessions(sorted(audio_files, key=file_sort_key), self.threshold_seconds)
+        self.group_keys = [file_sort_key(group.files[0]) for group in self.groups]
+        self.file_count = len(audio_files)
+        self.gap_index = None
+        title_groups(self.groups)
+        return [GroupSplice(0, removed, len(self.groups))]
+
+    def set_groups(self, groups: list[RecordingGroup]) -> list[GroupSplice]:
+        """Adopt manually edited sessions as they are; sessions that are new or were pinned stay pinned."""
+        current = {id(group) for group in self.groups}
+        groups = [group for group in groups if group.files]
+        pinned = {id(group) for group in groups if id(group) not in current or id(group) in self.pinned}
+        splice = self.splice(0, len(self.groups), groups, retitle=True)
+        self.pinned = pinned
+        return [splice]
+
+    def add(self, audio_files: list[AudioFile]) -> list[GroupSplice]:
+        if not audio_files:
+            return []
+        # A full regroup would drop the pins, so with manual edits every file is inserted on its own.
+        if not self.pinned and len(audio_files) > self.file_count * BULK_REGROUP_RATIO:
+            existing = [item for group in self.groups for item in group.files]
+            return self.rebuild(existing + audio_files)
+
+        splices = [self.insert(audio_file) for audio_file in sorted(audio_files, key=file_sort_key)]
+        title_groups(self.groups)
+        return splices
+
+    def insert(self, audio_file: AudioFile) -> GroupSplice:
+        key = file_sort_key(audio_file)
+        position = bisect_right(self.group_keys, key) - 1
+        start = max(position, 0)
+        stop = min(position + 2, len(self.groups))
+        self.file_count += 1
+        window = range(start, stop)
+        if any(id(self.groups[index]) in self.pinned for index in window):
+            return self.insert_near_pinned(audio_file, window)
+        files = [item for group in self.groups[start:stop] for item in group.files]
+        insort(files, audio_file, key=file_sort_key)
+        return self.splice(start, stop - start, split_sessions(files, self.threshold_seconds))
+
+    def insert_near_pinned(self, audio_file: AudioFile, window: range) -> GroupSplice:
+        """Add a file next to a pinned session: it joins a session it is within the threshold of, else stands alone."""
+        for index in window:
+            group = self.groups[index]
+            if id(group) in self.pinned and self.within_threshold(group, audio_file):
+                files = list(group.files)
+                insort(files, audio_file, key=file_sort_key)
+                return self.splice(index, 1, [RecordingGroup(files=files)], pinned=True)
+        unpinned = [index for index in window if id(self.groups[index]) not in self.pinned]
+        if not unpinned:
+            # Between two pinned sessions and close to neither: a session of its own.
+            return self.splice(window.start + 1, 0, [RecordingGroup(files=[audio_file])])
+        index = unpinned[0]
+        files = list(self.groups[index].files)
+        insort(files, audio_file, key=file_sort_key)
+        return self.splice(index, 1, split_sessions(files, self.threshold_seconds))
+
+    def within_threshold(self, group: RecordingGroup, audio_file: AudioFile) -> bool:
+        group_end = max(item.end_epoch for item in group.files)
+        return (
+            audio_file.start_epoch - group_end <= self.threshold_seconds
+            and group.files[0].start_epoch - audio_file.end_epoch <= self.threshold_seconds
+        )
+
+    def remove(self, audio_files: list[AudioFile]) -> list[GroupSplice]:
+        splices: list[GroupSplice] = []
+        for audio_file in audio_files:
+            position = self.find_group(audio_file)
+            if position is None:
+                continue
+            pinned = id(self.groups[position]) in self.pinned
+            # A pinned session, or one followed by a pinned session, only loses the file.
+            stop = position + 1
+            if not pinned and position + 1 < len(self.groups) and id(self.groups[position + 1]) not in self.pinned:
+                stop = position + 2
+            remaining = [
+                item for group in self.groups[position:stop] for item in group.files if item.path != audio_file.path
+            ]
+            self.file_count -= 1
+            if pinned:
+                new_groups = [RecordingGroup(files=remaining)] if remaining else []
+            else:
+                new_groups = split_sessions(remaining, self.threshold_seconds)
+            splices.append(self.splice(position, stop - position, new_groups, pinned=pinned))
+        title_groups(self.groups)
+        return splices
+
+    def gaps(self) -> GapIndex:
+        """Gap index over every file, rebuilt on first use after the sessions change."""
+        if self.gap_index is None:
+            self.gap_index = GapIndex([item for group in self.groups for item in group.files])
+        return self.gap_index
+
+    def find_group(self, audio_file: AudioFile) -> int | None:
+        position = bisect_right(self.group_keys, file_sort_key(audio_file)) - 1
+        # Manually merged sessions may overlap, so fall back to the neighbours before giving up.
+        for candidate in (position, position - 1, position + 1):
+            if 0 <= candidate < len(self.groups) and any(
+                item.path == audio_file.path for item in self.groups[candidate].files
+            ):
+                return candidate
+        return None
+
+    def splice(
+        self,
+        index: int,
+        removed: int,
+        new_groups: list[RecordingGroup],
+        retitle: bool = False,
+        pinned: bool = False,
+    ) -> GroupSplice:
+        """Replace ``removed`` groups at ``index``; with ``pinned`` the new groups are kept as manual edits."""
+        for group in self.groups[index : index + removed]:
+            self.pinned.discard(id(group))
+        if pinned:
+            self.pinned.update(id(group) for group in new_groups)
+        self.groups[index : index + removed] = new_groups
+        self.group_keys[index : index + removed] = [file_sort_key(group.files[0]) for group in new_groups]
+        self.gap_index = None
+        if retitle:
+            self.file_count = sum(len(group.files) for group in self.groups)
+            title_groups(self.groups)
+        return GroupSplice(index, removed, len(new_groups))
+
+
+class DuplicateIndex:
+    """Keeps the first file seen of each recorded chunk and sets later copies of it aside.
+
+    Copies of the same card imported twice (from the receiver and from a backup, say) would otherwise land
+    in one session side by side. A copy has the same content fingerprint and the same start time; the time
+    keeps two equally long stretches of digital silence apart. Files without a fingerprint are always kept.
+    """
+
+    def __init__(self) -> None:
+        self.kept: dict[tuple[str, datetime], AudioFile] = {}
+        # Key each kept path was last seen with, so a file that changed does not leave a stale entry.
+        self.keys: dict[Path, tuple[str, datetime]] = {}
+        # (duplicate, the kept file it copies), in the order they were found.
+        self.duplicates: list[tuple[AudioFile, AudioFile]] = []
+
+    def filter(self, audio_files: Iterable[AudioFile]) -> list[AudioFile]:
+        """Return the files that are not copies of a kept file, recording the others in ``duplicates``."""
+        unique: list[AudioFile] = []
+        for audio_file in audio_files:
+            key = (audio_file.fingerprint, audio_file.start_time)
+            original = self.kept.get(key) if audio_file.fingerprint else None
+            if original is not None and original.path != audio_file.path:
+                self.duplicates.append((audio_file, original))
+                continue
+            self.forget({audio_file.path})
+            if audio_file.fingerprint:
+                self.kept[key] = audio_file
+                self.keys[audio_file.path] = key
+            unique.append(audio_file)
+        return unique
+
+    def merge(self, audio_files: Iterable[AudioFile]) -> tuple[list[AudioFile], list[AudioFile]]:
+        """Like ``filter``, but of each set of copies the one first by name and path is kept, as a sorted scan would.
+
+        Files may arrive in any order, such as scan batches finishing on worker threads. Returns the files to
+        add and the previously returned files they displace, which the caller should drop again.
+        """
+        added: list[AudioFile] = []
+        displaced: list[AudioFile] = []
+        for audio_file in sorted(audio_files, key=self.order):
+            original = self.kept.get((audio_file.fingerprint, audio_file.start_time)) if audio_file.fingerprint else None
+            if original is not None and original.path != audio_file.path and self.order(audio_file) < self.order(original):
+                self.forget({original.path})
+                self.duplicates = [(copy, audio_file if kept is original else kept) for copy, kept in self.duplicates]
+                self.duplicates.append((original, audio_file))
+                if any(item is original for item in added):
+                    added = [item for item in added if item is not original]
+                else:
+                    displaced.append(original)
+            added.extend(self.filter([audio_file]))
+        return added, displaced
+
+    @staticmethod
+    def order(audio_file: AudioFile) -> tuple[str, str]:
+        # The tie-break Scanner.inspect_paths sorts copies by; their start times are equal.
+        return audio_file.path.name, str(audio_file.path)
+
+    def forget(self, paths: set[Path]) -> None:
+        """Drop kept files that left the file list, so a remaining copy is no longer treated as a duplicate."""
+        for path in paths:
+            key = self.keys.pop(path, None)
+            if key is not None:
+                self.kept.pop(key, None)
+
+
+# Stages of Scanner.inspect_path that read the files themselves.
+INSPECT_STAGES = ("probe_audio", "fingerprint")
+
+
+class Scanner:
+    """Reads WAV metadata, serving unchanged files from the scan cache and probing the rest on a thread pool."""
+
+    def __init__(
+        self,
+        ffmpeg: str | None,
+        cache: ScanCache | None = None,
+        workers: int = SCAN_WORKERS,
+        stats: RunStats | None = None,
+    ) -> None:
+        self.ffmpeg = ffmpeg
+        self.cache = cache
+        self.workers = workers
+        self.stats = stats or RunStats()
+
+    def inspect_paths(self, paths: list[Path]) -> tuple[list[AudioFile], int]:
+        """Return the readable files sorted by start time, plus the number of files skipped."""
+        inspected: list[AudioFile] = []
+        skipped = 0
+        started = time.perf_counter()
+        read_before = self.stats.bytes_read(*INSPECT_STAGES)
+        for batch, batch_skipped in self.iter_inspected_batches(paths):
+            inspected.extend(batch)
+            skipped += batch_skipped
+        self.stats.add(
+            "inspect_paths",
+            time.perf_counter() - started,
+            items=len(paths),
+            bytes_read=self.stats.bytes_read(*INSPECT_STAGES) - read_before,
+        )
+
+        # The full path breaks ties between copies, so the same one is kept as the original on every run.
+        inspected.sort(key=lambda item: (item.start_time, item.path.name, str(item.path)))
+        return inspected, skipped
+
+    def iter_inspected_batches(
+        self,
+        paths: Iterable[Path],
+        cancel_event: threading.Event | None = None,
+    ) -> Iterator[tuple[list[AudioFile], int]]:
+        """Inspect files on a thread pool and yield ``(files, skipped)`` batches as they finish.
+
+        ``paths`` may be a stream, such as a directory walk still in progress; each path is submitted as it arrives,
+        at most ``SCAN_WINDOW_PER_WORKER`` per worker ahead of the results, and finished files are yielded while
+        the walk is still running.
+        """
+        batch: list[AudioFile] = []
+        probed: list[tuple[AudioFile, os.stat_result]] = []
+        skipped = 0
+        last_flush = time.monotonic()
+        window = max(1, self.workers * SCAN_WINDOW_PER_WORKER)
+        remaining = iter(paths)
+        walking = True
+        pending: set[Future[tuple[AudioFile, os.stat_result | None]]] = set()
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            try:
+                while walking or pending:
+                    if cancel_event is not None and cancel_event.is_set():
+                        break
+                    if walking and len(pending) < window:
+                        path = next(remaining, None)
+                        if path is None:
+                            walking = False
+                        else:
+                            pending.add(pool.submit(self.inspect_path, path))
+                    # Only block once the window is full or the walk is over; otherwise just collect what is done.
+                    blocking = not walking or len(pending) >= window
+                    done, pending = wait(pending, timeout=None if blocking else 0, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        try:
+                            audio_file, stat = future.result()
+                        except Exception:
+                            skipped += 1
+                        else:
+                            batch.append(audio_file)
+                            if stat is not None:
+                                probed.append((audio_file, stat))
+
+                    if not done:
+                        continue
+                    if len(batch) + skipped >= SCAN_BATCH_SIZE or time.monotonic() - last_flush >= SCAN_BATCH_INTERVAL:
+                        self.store(probed)
+                        yield batch, skipped
+                        batch, probed, skipped = [], [], 0
+                        last_flush = time.monotonic()
+            finally:
+                for future in pending:
+                    future.cancel()
+
+        self.store(probed)
+        if batch or skipped:
+            yield batch, skipped
+
+    def store(self, probed: list[tuple[AudioFile, os.stat_result]]) -> None:
+        if self.cache is not None:
+            self.cache.store(probed)
+
+    def inspect_path(self, path: Path) -> tuple[AudioFile, os.stat_result | None]:
+        """Return the file's metadata, plus its stat result when it had to be probed rather than cached."""
+        stat = path.stat()
+        cached = self.cache.lookup(path, stat) if self.cache is not None else None
+        if cached is not None:
+            self.stats.add("cache_hit", 0.0, items=1)
+            return cached, None
+        started = time.perf_counter()
+        info = self.probe_audio(path)
+        self.stats.add("probe_audio", time.perf_counter() - started, items=1, bytes_read=info.bytes_read)
+        started = time.perf_counter()
+        fingerprint, fingerprint_bytes = content_fingerprint(path)
+        self.stats.add("fingerprint", time.perf_counter() - started, items=1, bytes_read=fingerprint_bytes)
+        audio_file = AudioFile(
+            path=path,
+            duration=info.duration,
+            size=stat.st_size,
+            start_time=extract_start_time(path, stat.st_mtime, info.origination),
+            channels=info.channels,
+            sample_rate=info.sample_rate,
+            bits_per_sample=info.bits_per_sample,
+            fingerprint=fingerprint,
+        )
+        return audio_file, stat
+
+    def probe_audio(self, path: Path) -> AudioInfo:
+        try:
+            header = read_wav_header(path)
+        except ValueError:
+            return AudioInfo(duration=self.probe_duration(path))
+        return AudioInfo(
+            duration=header.duration,
+            channels=header.channels,
+            sample_rate=header.sample_rate,
+            bits_per_sample=header.bits_per_sample,
+            origination=header.origination,
+            bytes_read=header.header_bytes,
+        )
+
+    def probe_duration(self, path: Path) -> float:
+        if not self.ffmpeg:
+            raise RuntimeError("ffmpeg is not available")
+
+        cmd = [
+            self.ffmpeg,
+            "-hide_banner",
+            "-i",
+            str(path),
+        ]
+        with self.stats.measure("probe_duration", items=1):
+            result = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+        match = re.search(r"Duration:\s*(\d+):(\d+):(\d+(?:\.\d+)?)", result.stderr)
+        if not match:
+            raise RuntimeError(f"无法读取音频时长：{path}")
+        hours = int(match.group(1))
+        minutes = int(match.group(2))
+        seconds = float(match.group(3))
+        return max(0.0, hours * 3600 + minutes * 60 + seconds)
+
+
+class FolderWatcher:
+    """Polls an ingest folder and exports each session once no chunk has arrived for ``threshold_minutes``.
+
+    Directory listings are only re-read when a directory's mtime changes; besides that, only files of
+    sessions that are still open get a stat() per poll. Everything kept in memory refers to files that
+    are currently on disk, so the footprint follows the folder, not the uptime.
+    """
+
+    def __init__(
+        self,
+        folder: Path,
+        output_folder: Path,
+        scanner: Scanner,
+        exporter: Exporter,
+        threshold_minutes: float,
+        recursive: bool = True,
+        delete_sources: bool = False,
+        emit: Callable[[str, object], None] | None = None,
+        ignore: Iterable[str] = DEFAULT_SCAN_IGNORE,
+    ) -> None:
+        self.folder = folder
+        self.output_folder = output_folder
+        self.skipped = {os.path.abspath(output_folder)}
+        self.ignore = [pattern.lower() for pattern in ignore]
+        self.scanner = scanner
+        self.exporter = exporter
+        self.threshold_seconds = max(0.0, threshold_minutes) * 60
+        self.recursive = recursive
+        self.delete_sources = delete_sources
+        self.emit = emit or (lambda _kind, _payload: None)
+        self.state_path = output_folder / WATCH_STATE_NAME
+
+        self.dir_mtimes: dict[Path, int] = {}
+        self.dir_children: dict[Path, list[Path]] = {}
+        self.dir_files: dict[Path, dict[Path, tuple[int, int]]] = {}
+        self.pending: dict[Path, AudioFile] = {}
+        self.arrived: dict[Path, float] = {}
+        self.exported: dict[Path, tuple[int, int]] = self.load_state()
+        self.duplicates = DuplicateIndex()
+
+    def run(self, stop_event: threading.Event, interval: float = WATCH_INTERVAL) -> None:
+        while not stop_event.is_set():
+            self.poll()
+            stop_event.wait(interval)
+
+    def poll(self) -> ExportResult | None:
+        now = time.monotonic()
+        changed, removed = self.scan_changes()
+        for path in removed:
+            self.pending.pop(path, None)
+            self.arrived.pop(path, None)
+            self.exported.pop(path, None)
+        self.duplicates.forget(set(removed))
+
+        if changed:
+            inspected, _skipped = self.scanner.inspect_paths(changed)
+            # A copy of a chunk that is pending or was already exported is never queued.
+            unique = self.duplicates.filter(inspected)
+            for audio_file in unique:
+                self.pending[audio_file.path] = audio_file
+                self.arrived[audio_file.path] = now
+            self.emit("status", f"发现 {len(inspected)} 个新的或变化的 WAV 文件。")
+            if len(unique) < len(inspected):
+                self.emit("status", f"跳过 {len(inspected) - len(unique)} 个与已有文件内容相同的重复分段。")
+
+        closed = [
+            group
+            for group in regroup_files(list(self.pending.values()), self.threshold_seconds / 60)
+            if now - max(self.arrived[item.path] for item in group.files) >= self.threshold_seconds
+        ]
+        if removed or closed:
+            self.save_state()
+        if not closed:
+            return None
+        return self.export_closed(closed, now)
+
+    def export_closed(self, groups: list[RecordingGroup], now: float) -> ExportResult:
+        try:
+            result = self.exporter.export_groups(groups, self.output_folder, self.delete_sources)
+        except Exception as exc:
+            result = ExportResult(failures=[str(exc)])
+
+        succeeded = set(result.source_paths)
+        deleted = set(result.deleted_paths)
+        for group in groups:
+            for audio_file in group.files:
+                if audio_file.path not in succeeded:
+                    # Retry a failed session after another quiet period instead of on every poll.
+                    self.arrived[audio_file.path] = now
+                    continue
+                self.pending.pop(audio_file.path, None)
+                self.arrived.pop(audio_file.path, None)
+                if audio_file.path not in deleted:
+                    self.exported[audio_file.path] = self.dir_files_entry(audio_file.path)
+        self.save_state()
+        self.emit("exported", result)
+        return result
+
+    def scan_changes(self) -> tuple[list[Path], list[Path]]:
+        """Return WAV files that are new or changed since the last poll, and files that disappeared."""
+        changed: list[Path] = []
+        removed: list[Path] = []
+        seen_dirs: set[Path] = set()
+        stack = [self.folder]
+        while stack:
+            directory = stack.pop()
+            seen_dirs.add(directory)
+            try:
+                mtime_ns = directory.stat().st_mtime_ns
+            except OSError:
+                continue
+
+            if self.dir_mtimes.get(directory) == mtime_ns:
+                stack.extend(self.dir_children.get(directory, []))
+                changed.extend(self.restat_pending(directory))
+                continue
+
+            previous = self.dir_files.get(directory, {})
+            current: dict[Path, tuple[int, int]] = {}
+            children: list[Path] = []
+            try:
+                with os.scandir(directory) as entries:
+                    for entry in entries:
+                        path = Path(entry.path)
+                        if entry.is_dir(follow_symlinks=False):
+                            if self.recursive and not is_ignored_directory(entry.name, entry.path, self.skipped, self.ignore):
+                                children.append(path)
+                        elif entry.is_file() and path.suffix.lower() in SUPPORTED_EXTENSIONS:
+                            stat = entry.stat()
+                            current[path] = (stat.st_size, stat.st_mtime_ns)
+            except OSError:
+                continue
+
+            self.dir_mtimes[directory] = mtime_ns
+            self.dir_children[directory] = children
+            self.dir_files[directory] = current
+            stack.extend(children)
+            removed.extend(path for path in previous if path not in current)
+            for path, signature in current.items():
+                if previous.get(path) != signature and self.exported.get(path) != signature:
+                    changed.append(path)
+
+        for directory in [path for path in self.dir_mtimes if path not in seen_dirs]:
+            removed.extend(self.dir_files.pop(directory, {}))
+            self.dir_children.pop(directory, None)
+            del self.dir_mtimes[directory]
+        return changed, removed
+
+    def restat_pending(self, directory: Path) -> list[Path]:
+        """Files still being written do not touch the directory mtime, so open sessions are stat()ed directly."""
+        changed: list[Path] = []
+        files = self.dir_files.get(directory, {})
+        for path in [path for path in files if path in self.pending]:
+            try:
+                stat = path.stat()
+            except OSError:
+                continue
+            signature = (stat.st_size, stat.st_mtime_ns)
+            if files[path] != signature:
+                files[path] = signature
+                changed.append(path)
+        return changed
+
+    def dir_files_entry(self, path: Path) -> tuple[int, int]:
+        return self.dir_files.get(path.parent, {}).get(path, (0, 0))
+
+    def load_state(self) -> dict[Path, tuple[int, int]]:
+        try:
+            data = json.loads(self.state_path.read_text(encoding="utf-8"))
+            return {Path(path): (int(size), int(mtime_ns)) for path, (size, mtime_ns) in data.get("exported", {}).items()}
+        except (OSError, ValueError, TypeError, AttributeError):
+            return {}
+
+    def save_state(self) -> None:
+        data = {"exported": {str(path): list(signature) for path, signature in self.exported.items()}}
+        try:
+            self.output_folder.mkdir(parents=True, exist_ok=True)
+            self.state_path.write_text(json.dumps(data, ensure_ascii=False), encoding="utf-8")
+        except OSError:
+            pass
+
+
+class ExportJournal:
+    """Records, per output folder, which session was exported to which file with which inputs and settings.
+
+    Entries are keyed by ``session_fingerprint`` and the file is replaced atomically on every save, so after a
+    crash it still tells finished sessions from ones that were interrupted mid-write. Finished entries whose
+    outputs are gone are dropped on load, and entries older than EXPORT_JOURNAL_RETENTION_DAYS on every save.
+    """
+
+    def __init__(self, output_folder: Path) -> None:
+        self.output_folder = output_folder
+        self.path = output_folder / EXPORT_JOURNAL_NAME
+        self.entries: dict[str, dict] = self.load()
+        self.prune(check_outputs=True)
+
+    def load(self) -> dict[str, dict]:
+        try:
+            data = json.loads(self.path.read_text(encoding="utf-8"))
+            return {str(key): dict(entry) for key, entry in data.get("sessions", {}).items()}
+        except (OSError, ValueError, TypeError, AttributeError):
+            return {}
+
+    def prune(self, check_outputs: bool = False) -> None:
+        """Drop entries past the retention window and, with ``check_outputs``, finished ones whose files are gone."""
+        cutoff = (datetime.now() - timedelta(days=EXPORT_JOURNAL_RETENTION_DAYS)).isoformat(timespec="seconds")
+        for key, entry in list(self.entries.items()):
+            if entry.get("state") == "running":
+                continue
+            if str(entry.get("updated", "")) < cutoff or (
+                check_outputs
+                and entry.get("state") == "done"
+                and not all(path.exists() for path in self.outputs_for(key) or [])
+            ):
+                del self.entries[key]
+
+    def save(self) -> None:
+        self.prune()
+        temp_path = self.path.with_name(self.path.name + ".tmp")
+        try:
+            temp_path.write_text(json.dumps({"sessions": self.entries}, ensure_ascii=False), encoding="utf-8")
+            os.replace(temp_path, self.path)
+        except OSError:
+            pass
+
+    def update(self, key: str, **fields: object) -> None:
+        entry = self.entries.setdefault(key, {})
+        entry.update(fields, updated=datetime.now().isoformat(timespec="seconds"))
+
+    def outputs_for(self, key: str) -> list[Path] | None:
+        """Every output file of a session, the main format first; entries from before multi-format exports have one."""
+        entry = self.entries.get(key)
+        if not entry or not entry.get("output"):
+            return None
+        names = [entry["output"], *entry.get("extra_outputs", [])]
+        return [self.output_folder / name for name in names]
+
+    def completed_outputs(self, key: str) -> list[Path] | None:
+        """The outputs of a finished session, if all are still on disk with the sizes they were written with."""
+        entry = self.entries.get(key)
+        paths = self.outputs_for(key)
+        if not entry or paths is None or entry.get("state") != "done":
+            return None
+        sizes = [entry.get("size"), *entry.get("extra_sizes", [])]
+        try:
+            return paths if [path.stat().st_size for path in paths] == sizes else None
+        except OSError:
+            return None
+
+    def recover(self) -> list[Path]:
+        """Delete the partial files of sessions that never finished."""
+        removed: list[Path] = []
+        for key, entry in list(self.entries.items()):
+            output_paths = self.outputs_for(key) or []
+            if entry.get("state") == "running":
+                for output_path in output_paths:
+                    partial = partial_output_path(output_path)
+                    if partial.exists():
+                        try:
+                            partial.unlink()
+                            removed.append(partial)
+                        except OSError:
+                            pass
+                entry["state"] = "interrupted"
+        return removed
+
+
+class SourceStager:
+    """Copies the chunks of upcoming sessions to local scratch space while earlier sessions encode.
+
+    A background thread stages sessions in export order, reading each chunk front to back in large blocks,
+    and stays at most ``budget`` bytes ahead of the encoders. Sessions larger than the whole budget, and any
+    whose copy fails, are read from their sources as before. Staged copies are deleted on ``release``; a
+    session released before its turn (a cache hit, say) is skipped, so it never holds budget nobody frees.
+    """
+
+    def __init__(
+        self,
+        groups: list[RecordingGroup],
+        root: Path | None,
+        budget: int,
+        cancel_event: threading.Event,
+        stats: RunStats,
+    ) -> None:
+        self.budget = budget
+        self.cancel_event = cancel_event
+        self.stats = stats
+        self.folder = Path(tempfile.mkdtemp(prefix="wav_merger_stage_", dir=root))
+        self.condition = threading.Condition()
+        # id(group) -> its staged copy, or None when the session is read from its source.
+        self.staged: dict[int, RecordingGroup | None] = {}
+        self.sizes: dict[int, int] = {}
+        # Sessions this stager was given, and those released before their copy was handed over.
+        self.planned = {id(group) for group in groups}
+        self.released: set[int] = set()
+        self.used = 0
+        self.closed = False
+        self.thread = threading.Thread(target=self.run, args=(groups,), daemon=True)
+        self.thread.start()
+
+    def stopped(self) -> bool:
+        return self.closed or self.cancel_event.is_set()
+
+    def run(self, groups: list[RecordingGroup]) -> None:
+        for index, group in enumerate(groups):
+            size = group.size
+            fits = size <= self.budget
+            with self.condition:
+                # Wait for encoders to release space, unless nothing is staged: then waiting would never end.
+                while (
+                    fits
+                    and self.used
+                    and self.used + size > self.budget
+                    and id(group) not in self.released
+                    and not self.stopped()
+                ):
+                    self.condition.wait(0.5)
+                if self.stopped():
+                    return
+                if id(group) in self.released:
+                    continue
+                if fits:
+                    self.used += size
+            staged = self.copy_group(index, group) if fits else None
+            with self.condition:
+                if fits:
+                    self.used -= size
+                if id(group) not in self.released:
+                    if staged is not None:
+                        self.used += size
+                        self.sizes[id(group)] = size
+                    self.staged[id(group)] = staged
+                    staged = None
+                self.condition.notify_all()
+            if staged is not None and staged.files:
+                # Released while it was being copied: nobody will ask for this copy.
+                shutil.rmtree(staged.files[0].path.parent, ignore_errors=True)
+
+    def copy_group(self, index: int, group: RecordingGroup) -> RecordingGroup | None:
+        folder = self.folder / f"{index:04d}"
+        copied = 0
+
+        def on_copied(count: int) -> None:
+            nonlocal copied
+            if self.stopped():
+                raise OSError("staging stopped")
+            copied += count
+
+        started = time.perf_counter()
+        files: list[AudioFile] = []
+        try:
+            folder.mkdir()
+            for number, audio_file in enumerate(group.files):
+                target = folder / f"{number:04d}{audio_file.path.suffix}"
+                with target.open("wb", buffering=0) as output:
+                    copy_file_data(audio_file.path, 0, audio_file.path.stat().st_size, output, on_copied)
+                files.append(replace(audio_file, path=target))
+        except OSError:
+            shutil.rmtree(folder, ignore_errors=True)
+            return None
+        finally:
+            self.stats.add("stage_sources", time.perf_counter() - started, len(files), copied, copied)
+        return RecordingGroup(files=files, title=group.title)
+
+    def acquire(self, group: RecordingGroup) -> RecordingGroup:
+        """Wait until ``group`` has been staged and return the copy, or ``group`` itself if it was not staged."""
+        with self.condition:
+            if id(group) not in self.planned:
+                return group
+            while id(group) not in self.staged and not self.stopped():
+                self.condition.wait(0.5)
+            return self.staged.get(id(group)) or group
+
+    def release(self, group: RecordingGroup) -> None:
+        with self.condition:
+            if id(group) in self.planned and id(group) not in self.staged:
+                self.released.add(id(group))
+            staged = self.staged.pop(id(group), None)
+            self.used -= self.sizes.pop(id(group), 0)
+            self.condition.notify_all()
+        if staged is not None and staged.files:
+            shutil.rmtree(staged.files[0].path.parent, ignore_errors=True)
+
+    def close(self) -> None:
+        with self.condition:
+            self.closed = True
+            self.condition.notify_all()
+        self.thread.join()
+        shutil.rmtree(self.folder, ignore_errors=True)
+
+
+class SourceTrasher:
+    """Moves the sources of exported sessions to the trash on a background thread while later sessions encode.
+
+    Sessions submitted while a call is running go out together in the next bulk call. When a bulk call fails,
+    its sessions are retried one by one, so a source that cannot be trashed only holds back its own session.
+    """
+
+    def __init__(self, stats: RunStats) -> None:
+        self.stats = stats
+        self.condition = threading.Condition()
+        self.pending: list[list[Path]] = []
+        self.trashed: list[Path] = []
+        self.failures: list[str] = []
+        self.closed = False
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def submit(self, paths: Iterable[Path]) -> None:
+        with self.condition:
+            self.pending.append(list(paths))
+            self.condition.notify_all()
+
+    def run(self) -> None:
+        while True:
+            with self.condition:
+                while not self.pending and not self.closed:
+                    self.condition.wait()
+                if not self.pending:
+                    return
+                sessions, self.pending = self.pending, []
+            paths = [path for session in sessions for path in session]
+            with self.stats.measure("move_paths_to_trash", items=len(paths)):
+                if len(sessions) > 1 and self.trash(paths, report=False):
+                    continue
+                for session in sessions:
+                    self.trash(session)
+
+    def trash(self, paths: list[Path], report: bool = True) -> bool:
+        try:
+            move_paths_to_trash(paths)
+        except Exception as exc:
+            if report:
+                # The call may still have moved part of the list before it failed.
+                self.trashed.extend(path for path in paths if not path.exists())
+                self.failures.append(f"移到废纸篓失败：{exc}")
+            return False
+        self.trashed.extend(paths)
+        return True
+
+    def close(self) -> None:
+        """Wait until everything submitted has been trashed or has failed."""
+        with self.condition:
+            self.closed = True
+            self.condition.notify_all()
+        self.thread.join()
+
+
+def build_ffmpeg_command(
+    ffmpeg: str | None,
+    filelist_path: Path,
+    output_path: Path,
+    settings: ExportSettings,
+    sample_range: tuple[int, int] | None = None,
+    cuts: list[tuple[float, float]] | None = None,
+    extra_outputs: Sequence[tuple[ExportSettings, Path]] = (),
+) -> list[str]:
+    """Build the concat-demuxer encode; ``sample_range`` encodes only those output samples as raw frames.
+
+    ``cuts`` are ``(start, end)`` seconds of the joined input that are left out of the output.
+    ``extra_outputs`` are further ``(settings, path)`` targets encoded from the same decoded input.
+    """
+    cmd = [
+        ffmpeg or "ffmpeg",
+        "-hide_banner",
+        "-y",
+        "-f",
+        "concat",
+        "-safe",
+        "0",
+        "-i",
+        str(filelist_path),
+        *output_args(settings, sample_range, cuts),
+        "-progress",
+        "pipe:1",
+        "-nostats",
+        str(output_path),
+    ]
+    for extra_settings, extra_path in extra_outputs:
+        cmd.extend([*output_args(extra_settings, None, cuts), str(extra_path)])
+    return cmd
+
+
+def output_args(
+    settings: ExportSettings,
+    sample_range: tuple[int, int] | None = None,
+    cuts: list[tuple[float, float]] | None = None,
+) -> list[str]:
+    """The ffmpeg options of one output file; every output of a command carries its own codec and filters."""
+    preset = settings.preset
+    cmd = ["-vn", *preset["codec_args"]]
+
+    if settings.format in {"m4a", "mp3"}:
+        cmd.extend(["-b:a", f"{settings.bitrate}k"])
+        if settings.mix_to_mono:
+            cmd.extend(["-ac", "1"])
+        cmd.extend(["-ar", str(settings.sample_rate)])
+
+    filters: list[str] = []
+    if cuts:
+        dropped = "+".join(f"between(t,{start:.3f},{end:.3f})" for start, end in cuts)
+        filters.extend([f"aselect='not({dropped})'", "asetpts=N/SR/TB"])
+    if sample_range is not None:
+        start, end = sample_range
+        filters.extend(
+            [f"aresample={settings.sample_rate}", f"atrim=start_sample={start}:end_sample={end}", "asetpts=PTS-STARTPTS"]
+        )
+    if filters:
+        cmd.extend(["-af", ",".join(filters)])
+
+    if sample_range is not None:
+        cmd.extend(preset["segment_args"])
+    elif settings.format == "m4a":
+        cmd.extend(["-movflags", "+faststart"])
+    return cmd
+
+
+def build_remux_command(
+    ffmpeg: str | None, stream_path: Path, output_path: Path, settings: ExportSettings, delay: int = 0
+) -> list[str]:
+    """Wrap joined raw frames in the final container without re-encoding.
+
+    ``delay`` priming samples at the start of the stream are shifted before zero, which the MP4 muxer
+    records as an edit list so players skip them like they do for a direct encode.
+    """
+    preset = settings.preset
+    offset = ["-itsoffset", f"{-delay / settings.sample_rate:.6f}"] if delay else []
+    return [
+        ffmpeg or "ffmpeg",
+        "-hide_banner",
+        "-y",
+        "-f",
+        preset["segment_demuxer"],
+        *offset,
+        "-i",
+        str(stream_path),
+        "-c",
+        "copy",
+        *preset["remux_args"],
+        "-progress",
+        "pipe:1",
+        "-nostats",
+        str(output_path),
+    ]
+
+
+class Exporter:
+    """Runs session exports on a bounded worker pool and reports ``(kind, payload)`` events through ``emit``."""
+
+    def __init__(
+        self,
+        ffmpeg: str | None,
+        settings: ExportSettings,
+        workers: int = DEFAULT_EXPORT_WORKERS,
+        emit: Callable[[str, object], None] | None = None,
+        stats: RunStats | None = None,
+        cache: ExportCache | None = None,
+        split_long_sessions: bool = True,
+        span_cache: ScanCache | None = None,
+        stage_sources: bool = False,
+        stage_root: Path | None = None,
+        stage_budget: int = STAGE_BUDGET,
+        verify_outputs: bool = True,
+    ) -> None:
+        self.ffmpeg = ffmpeg
+        self.settings = settings
+        self.workers = max(1, workers)
+        self.emit = emit or (lambda _kind, _payload: None)
+        self.stats = stats or RunStats()
+        self.cache = cache
+        self.split_long_sessions = split_long_sessions
+        self.span_cache = span_cache
+        self.stage_sources = stage_sources
+        self.stage_root = stage_root
+        self.stage_budget = stage_budget
+        self.stager: SourceStager | None = None
+        self.verify_outputs = verify_outputs
+        self.cancel_event = threading.Event()
+        self.process_lock = threading.Lock()
+        self.current_processes: set[subprocess.Popen[str]] = set()
+        # Split encoding runs a segment pool inside each export worker; this caps ffmpeg processes at
+        # ``workers`` across both levels. Slots are only held while a process runs, never while waiting.
+        self.ffmpeg_slots = threading.BoundedSemaphore(self.workers)
+
+    def export_groups(
+        self,
+        groups: list[RecordingGroup],
+        output_folder: Path,
+        delete_sources: bool,
+        resume: bool = False,
+    ) -> ExportResult:
+        """Export every group; raises only when nothing could be exported.
+
+        With ``resume``, sessions the output folder's journal lists as finished with the same inputs and
+        settings are skipped. Partial files left by an interrupted run are removed either way.
+        With ``delete_sources``, each session's sources are trashed as soon as its outputs are in place.
+        """
+        if self.settings.trim_silence and np is None:
+            raise RuntimeError("缺少 numpy 依赖，无法裁剪静音。请先运行 ./setup.sh。")
+        if delete_sources and send2trash is None:
+            raise RuntimeError("缺少 send2trash 依赖，请先运行 ./setup.sh。")
+        output_folder.mkdir(parents=True, exist_ok=True)
+        journal = ExportJournal(output_folder)
+        journal.recover()
+        result = ExportResult()
+        trasher = SourceTrasher(self.stats) if delete_sources else None
+
+        # Reserve every output name up front so parallel jobs never race for the same file. A session the
+        # journal already knows keeps its earlier name instead of getting a "-2" copy next to it.
+        reserved: set[Path] = set()
+        variants = self.settings.variants()
+        jobs: list[tuple[RecordingGroup, list[Path], str]] = []
+        skipped = 0
+        for group in groups:
+            key = session_fingerprint(group, self.settings)
+            completed = journal.completed_outputs(key) if resume else None
+            if completed is not None and reserved.isdisjoint(completed):
+                reserved.update(completed)
+                result.outputs.extend(completed)
+                result.resumed.extend(completed)
+                result.source_paths.extend(audio_file.path for audio_file in group.files)
+                if trasher is not None:
+                    trasher.submit(audio_file.path for audio_file in group.files)
+                skipped += 1
+                continue
+            output_paths = journal.outputs_for(key)
+            if output_paths is None or len(output_paths) != len(variants) or not reserved.isdisjoint(output_paths):
+                output_paths = reserve_output_paths(output_folder, group, variants, reserved)
+            reserved.update(output_paths)
+            jobs.append((group, output_paths, key))
+            journal.update(
+                key,
+                output=output_paths[0].name,
+                extra_outputs=[path.name for path in output_paths[1:]],
+                state="running",
+                inputs=[str(audio_file.path) for audio_file in group.files],
+                settings=vars(self.settings).copy(),
+            )
+        journal.save()
+        if skipped:
+            self.emit("status", f"跳过 {skipped} 个已导出的会话。")
+
+        total_duration = max(1.0, sum(group.duration for group, _output_paths, _key in jobs))
+        progress: dict[int, float] = {}
+        progress_lock = threading.Lock()
+        last_emit = 0.0
+
+        def report(index: int, seconds: float, force: bool = False) -> None:
+            # Every job overwrites its own latest value; the total is only emitted once per interval.
+            nonlocal last_emit
+            with progress_lock:
+                progress[index] = min(seconds, jobs[index][0].duration)
+                now = time.monotonic()
+                if not force and now - last_emit < PROGRESS_EMIT_INTERVAL:
+                    return
+                last_emit = now
+                overall = sum(progress.values()) / total_duration * 100
+            self.emit("progress", min(99.0, overall))
+
+        # Lossless WAV joins already read every chunk once, front to back; staging would only add a copy.
+        # Sessions the export cache holds in full never read their sources, so they are not staged either.
+        staged_groups = [
+            group
+            for group, _output_paths, _key in jobs
+            if self.cache is None
+            or not all(self.cache.contains(session_fingerprint(group, variant)) for variant in variants)
+        ]
+        if self.stage_sources and staged_groups and any(variant.format != "wav" for variant in variants):
+            self.stager = SourceStager(
+                staged_groups,
+                self.stage_root,
+                self.stage_budget,
+                self.cancel_event,
+                self.stats,
+            )
+        try:
+            with ThreadPoolExecutor(max_workers=max(1, min(self.workers, len(jobs) or 1))) as pool:
+                # A session that dominates the batch gets a matching share of the workers for split encoding.
+                futures = {
+                    pool.submit(
+                        self.export_group,
+                        group,
+                        output_paths,
+                        lambda seconds, i=index: report(i, seconds),
+                        max(1, round(self.workers * group.duration / total_duration)),
+                    ): index
+                    for index, (group, output_paths, _key) in enumerate(jobs)
+                }
+                for finished, future in enumerate(as_completed(futures), start=1):
+                    index = futures[future]
+                    group, output_paths, key = jobs[index]
+                    try:
+                        future.result()
+                    except Exception as exc:
+                        result.failures.append(f"{output_paths[0].name}：{exc}")
+                        for output_path in output_paths:
+                            self.remove_partial_output(partial_output_path(output_path))
+                        journal.update(key, state="failed")
+                    else:
+                        result.outputs.extend(output_paths)
+                        result.source_paths.extend(audio_file.path for audio_file in group.files)
+                        sizes = [output_path.stat().st_size for output_path in output_paths]
+                        journal.update(key, state="done", size=sizes[0], extra_sizes=sizes[1:])
+                        if trasher is not None and all(sizes):
+                            trasher.submit(audio_file.path for audio_file in group.files)
+                    journal.save()
+                    report(index, group.duration, force=True)
+                    self.emit("status", f"已处理 {finished}/{len(jobs)}：{output_paths[0].name}")
+        finally:
+            if self.stager is not None:
+                self.stager.close()
+                self.stager = None
+            if trasher is not None:
+                trasher.close()
+
+        if trasher is not None:
+            result.deleted_paths = trasher.trashed
+            result.failures.extend(trasher.failures)
+
+        if result.failures and not result.outputs:
+            raise RuntimeError("\n\n".join(result.failures))
+        return result
+
+    def export_group(
+        self,
+        group: RecordingGroup,
+        output_paths: list[Path],
+        on_progress: Callable[[float], None],
+        segments: int = 1,
+    ) -> None:
+        """Export one session to one path per format and record its timing; failed sessions are not recorded.
+
+        ``segments`` above one lets a long single-format transcode run as that many parallel encodes.
+        """
+        if self.cancel_event.is_set():
+            raise RuntimeError("导出已取消。")
+
+        started = time.perf_counter()
+        speed: float | None = None
+        variants = self.settings.variants()
+        # Write under hidden names and rename on success, so an output path is never a half-written file.
+        partial_paths = [partial_output_path(output_path) for output_path in output_paths]
+        # Each format is cached on its own, so adding a format later still reuses the encodes already stored.
+        fingerprints = [session_fingerprint(group, variant) for variant in variants] if self.cache is not None else []
+        stager = self.stager
+        pending = list(zip(variants, partial_paths))
+        try:
+            if self.cache is not None:
+                cache = self.cache
+                pending = [target for key, target in zip(fingerprints, pending) if not cache.fetch(key, target[1])]
+            if not pending:
+                method = "cache"
+            else:
+                cuts = self.silence_cuts(group) if self.settings.trim_silence else []
+                if cuts:
+                    # Progress arrives in output seconds; stretch it back onto the untrimmed session length.
+                    kept = max(0.001, group.duration - sum(end - start for start, end in cuts))
+                    on_progress = scaled_progress(on_progress, group.duration / kept)
+                # Encoders read the local copy when one was staged; caches and the journal keep the source paths.
+                source = self.staged_sources(stager, group)
+                (settings, partial_path), *others = pending
+                if others:
+                    method, speed = self.write_formats(source, pending, on_progress, cuts)
+                else:
+                    headers = self.read_headers(source) if settings.format == "wav" else None
+                    if headers is not None and headers_share_format(headers):
+                        method = "copy"
+                        self.concat_wav_files(source, headers, partial_path, on_progress, cuts)
+                    elif settings is variants[0]:
+                        method, speed = self.transcode_group(source, partial_path, on_progress, segments, cuts)
+                    else:
+                        method = "ffmpeg"
+                        speed = self.encode_group(source, partial_path, on_progress, cuts=cuts, targets=pending)
+                if self.verify_outputs:
+                    # Cached outputs were checked before they were stored; only the new ones are read.
+                    fresh = {partial for _variant, partial in pending}
+                    problems = self.check_outputs(
+                        [(partial, output) for partial, output in zip(partial_paths, output_paths) if partial in fresh],
+                        group.duration - sum(end - start for start, end in cuts),
+                        VERIFY_TOLERANCE_SECONDS + len(cuts) * VERIFY_CUT_TOLERANCE_SECONDS,
+                    )
+                    if problems:
+                        folder = output_paths[0].parent / QUARANTINE_DIR_NAME
+                        quarantine_outputs(partial_paths, [path.name for path in output_paths], folder)
+                        raise RuntimeError(
+                            f"输出文件校验未通过，已移到 {QUARANTINE_DIR_NAME} 文件夹，源文件保留：\n" + "\n".join(problems)
+                        )
+            for partial_path, output_path in zip(partial_paths, output_paths):
+                os.replace(partial_path, output_path)
+        except BaseException:
+            for partial_path in partial_paths:
+                self.remove_partial_output(partial_path)
+            raise
+        finally:
+            if stager is not None:
+                stager.release(group)
+        # Lossless WAV joins are as fast as a copy from the store would be, so only encodes are kept.
+        # The outputs are already published here, so a cache that cannot keep them must not fail the session.
+        if self.cache is not None:
+            encoded = {variant.format for variant, _path in pending if variant.format != "wav" or "copy" not in method}
+            for fingerprint, variant, output_path in zip(fingerprints, variants, output_paths):
+                if variant.format in encoded:
+                    try:
+                        self.cache.store(fingerprint, output_path)
+                    except (OSError, sqlite3.Error):
+                        pass
+
+        written = 0
+        for output_path in output_paths:
+            try:
+                written += output_path.stat().st_size
+            except OSError:
+                pass
+        self.stats.add_session(
+            SessionStats(
+                name=output_paths[0].name,
+                method=method,
+                media_seconds=group.duration,
+                seconds=time.perf_counter() - started,
+                bytes_read=group.size,
+                bytes_written=written,
+                ffmpeg_speed=speed,
+            )
+        )
+
+    def write_formats(
+        self,
+        group: RecordingGroup,
+        targets: list[tuple[ExportSettings, Path]],
+        on_progress: Callable[[float], None],
+        cuts: list[tuple[float, float]],
+    ) -> tuple[str, float | None]:
+        """Write every format of a session while reading its chunks only once.
+
+        Same-format WAV chunks are joined losslessly first and the other formats are encoded from that one
+        local file; otherwise a single ffmpeg run decodes the chunks and encodes all formats side by side.
+        """
+        wav_target = next((target for target in targets if target[0].format == "wav"), None)
+        headers = self.read_headers(group) if wav_target is not None else None
+        if wav_target is None or headers is None or not headers_share_format(headers):
+            return "ffmpeg", self.encode_group(group, targets[0][1], on_progress, cuts=cuts, targets=targets)
+
+        # The join and the encode each cover half of the session's progress, in output seconds.
+        kept = group.duration - sum(end - start for start, end in cuts)
+        self.concat_wav_files(group, headers, wav_target[1], scaled_progress(on_progress, 0.5), cuts)
+        joined = AudioFile(wav_target[1], kept, wav_target[1].stat().st_size, group.files[0].start_time)
+        others = [target for target in targets if target is not wav_target]
+        speed = self.encode_group(
+            RecordingGroup(files=[joined]),
+            others[0][1],
+            lambda seconds: on_progress((kept + seconds) / 2),
+            targets=others,
+        )
+        return "copy+ffmpeg", speed
+
+    def check_outputs(self, outputs: list[tuple[Path, Path]], expected: float, tolerance: float) -> list[str]:
+        """Compare the header duration of each written file with the session's; return what did not match.
+
+        ``outputs`` are ``(written path, final path)`` pairs. Only container headers are read, never audio.
+        """
+        problems: list[str] = []
+        with self.stats.measure("verify_outputs", items=len(outputs)):
+            for path, output_path in outputs:
+                try:
+                    duration = output_duration(path)
+                except (OSError, ValueError) as exc:
+                    problems.append(f"{output_path.name}：无法读取文件头（{exc}）")
+                    continue
+                if abs(duration - expected) > tolerance:
+                    problems.append(f"{output_path.name}：时长 {duration:.1f} 秒，应为 {expected:.1f} 秒")
+        return problems
+
+    def staged_sources(self, stager: SourceStager | None, group: RecordingGroup) -> RecordingGroup:
+        if stager is None:
+            return group
+        # Time spent here is I/O the staging thread could not hide behind earlier encodes.
+        with self.stats.measure("stage_wait"):
+            return stager.acquire(group)
+
+    def transcode_group(
+        self,
+        group: RecordingGroup,
+        output_path: Path,
+        on_progress: Callable[[float], None],
+        segments: int,
+        cuts: list[tuple[float, float]],
+    ) -> tuple[str, float | None]:
+        # Cuts shift every later sample, so segment bounds planned on the untrimmed timeline would not line up.
+        bounds = self.plan_segments(group, segments) if self.split_long_sessions and not cuts else []
+        if bounds:
+            try:
+                return "ffmpeg-split", self.encode_group_split(group, bounds, output_path, on_progress)
+            except ValueError:
+                # The segment streams did not look as expected; a single encode is slower but always correct.
+                pass
+        return "ffmpeg", self.encode_group(group, output_path, on_progress, cuts=cuts)
+
+    def encode_group(
+        self,
+        group: RecordingGroup,
+        output_path: Path,
+        on_progress: Callable[[float], None],
+        sample_range: tuple[int, int] | None = None,
+        cuts: list[tuple[float, float]] | None = None,
+        targets: list[tuple[ExportSettings, Path]] | None = None,
+    ) -> float | None:
+        """Transcode through ffmpeg's concat demuxer and return the last ``speed=`` it reported.
+
+        ``targets`` replaces the single ``(self.settings, output_path)`` output with several, written in one run.
+        """
+        if not self.ffmpeg:
+            raise RuntimeError("未找到 ffmpeg，请先安装 ffmpeg。")
+
+        with tempfile.NamedTemporaryFile("w", encoding="utf-8", suffix=".txt", delete=False) as filelist:
+            filelist_path = Path(filelist.name)
+            for audio_file in group.files:
+                filelist.write(f"file '{escape_concat_path(audio_file.path)}'\n")
+
+        try:
+            (settings, output_path), *extra_outputs = targets or [(self.settings, output_path)]
+            cmd = build_ffmpeg_command(
+                self.ffmpeg, filelist_path, output_path, settings, sample_range, cuts, extra_outputs
+            )
+            return self.run_ffmpeg(cmd, on_progress)
+        finally:
+            try:
+                filelist_path.unlink()
+            except OSError:
+                pass
+
+    def plan_segments(self, group: RecordingGroup, segments: int) -> list[int]:
+        """Return segment boundaries in output samples, cut at chunk starts, or ``[]`` to encode in one piece.
+
+        Every inner boundary lies on the codec's frame grid shifted by its encoder delay, so each segment's
+        frames start exactly at its boundary and can be joined without a gap or an overlap.
+        """
+        preset = self.settings.preset
+        if "frame_size" not in preset or not self.ffmpeg or len(group.files) < 2:
+            return []
+        segments = min(segments, len(group.files), int(group.duration // SPLIT_SEGMENT_SECONDS))
+        if segments < 2:
+            return []
+
+        rate = self.settings.sample_rate
+        frame, delay = codec_frame_size(self.settings), preset["encoder_delay"]
+        offsets = chunk_offsets(group, rate)
+        starts, total = offsets[:-1], offsets[-1]
+
+        bounds = [0]
+        for index in range(1, segments):
+            target = total * index / segments
+            chunk_start = min(starts[1:], key=lambda start: abs(start - target))
+            boundary = (chunk_start + delay) // frame * frame - delay
+            if boundary - bounds[-1] >= SPLIT_SEGMENT_SECONDS * rate / 2 and total - boundary >= SPLIT_SEGMENT_SECONDS * rate / 2:
+                bounds.append(boundary)
+        bounds.append(total)
+        return bounds if len(bounds) > 2 else []
+
+    def encode_group_split(
+        self,
+        group: RecordingGroup,
+        bounds: list[int],
+        output_path: Path,
+        on_progress: Callable[[float], None],
+    ) -> float | None:
+        """Encode the segments between ``bounds`` in parallel, join their frames and remux once.
+
+        Each segment after the first starts ``context`` samples early and each one but the last runs
+        ``context`` samples long; the encoder delay and that context are then dropped by counting frames,
+        so the joined stream carries every sample exactly once.
+        """
+        rate = self.settings.sample_rate
+        frame, delay = codec_frame_size(self.settings), self.settings.preset["encoder_delay"]
+        # Lead-in that ends on a frame boundary once the encoder delay is added.
+        context = -(-(round(SPLIT_CONTEXT_SECONDS * rate) + delay) // frame) * frame - delay
+        count = len(bounds) - 1
+        progress = [0.0] * count
+        progress_lock = threading.Lock()
+
+        def report(index: int, seconds: float) -> None:
+            with progress_lock:
+                progress[index] = seconds
+                total = sum(progress)
+            on_progress(min(total, group.duration))
+
+        with tempfile.TemporaryDirectory(prefix="wav_merger_split_") as scratch:
+            scratch_path = Path(scratch)
+            jobs = []
+            for index in range(count):
+                start = bounds[index] - (context if index else 0)
+                end = bounds[index + 1] + (context if index < count - 1 else 0)
+                first_frame = (context + delay) // frame if index else 0
+                keep = (bounds[index + 1] - bounds[index] + (delay if not index else 0)) // frame
+                jobs.append((index, start, end, first_frame, None if index == count - 1 else keep))
+
+            with ThreadPoolExecutor(max_workers=count) as pool:
+                futures = [
+                    pool.submit(
+                        self.encode_segment,
+                        group,
+                        (start, end),
+                        scratch_path / f"segment-{index:03d}",
+                        lambda seconds, i=index: report(i, seconds),
+                    )
+                    for index, start, end, _first, _keep in jobs
+                ]
+                segment_paths = [future.result() for future in futures]
+
+            stream_path = scratch_path / ("joined." + self.settings.preset["segment_args"][-1])
+            frames = 0
+            with stream_path.open("wb") as stream:
+                for (_index, _start, _end, first_frame, keep), segment_path in zip(jobs, segment_paths):
+                    copied = copy_codec_frames(segment_path, stream, first_frame, keep)
+                    if keep is not None and copied != keep:
+                        raise ValueError(f"{segment_path.name}: expected {keep} frames, got {copied}")
+                    frames += copied
+            # The joined stream still opens with the first segment's priming; both containers are told to skip it.
+            if self.settings.format == "mp3":
+                # ffmpeg's MP3 demuxer would swallow an Info frame on remux, so the file is written directly.
+                with stream_path.open("rb") as stream, output_path.open("wb") as output:
+                    output.write(mp3_info_frame(stream.read(4), frames, frame, bounds[-1], delay, stream_path.stat().st_size))
+                    stream.seek(0)
+                    shutil.copyfileobj(stream, output)
+                return None
+            return self.run_ffmpeg(
+                build_remux_command(self.ffmpeg, stream_path, output_path, self.settings, delay), lambda _seconds: None
+            )
+
+    def encode_segment(
+        self,
+        group: RecordingGroup,
+        sample_range: tuple[int, int],
+        stem: Path,
+        on_progress: Callable[[float], None],
+    ) -> Path:
+        # Only the chunks that overlap the range are read; the trim is relative to the first of them.
+        start, end = sample_range
+        offsets = chunk_offsets(group, self.settings.sample_rate)
+        files: list[AudioFile] = []
+        offset = 0
+        for audio_file, chunk_start, chunk_end in zip(group.files, offsets, offsets[1:]):
+            if chunk_end > start and chunk_start < end:
+                if not files:
+                    offset = chunk_start
+                files.append(audio_file)
+        segment_path = stem.with_suffix("." + self.settings.preset["segment_args"][-1])
+        self.encode_group(
+            RecordingGroup(files=files),
+            segment_path,
+            on_progress,
+            sample_range=(start - offset, end - offset),
+        )
+        return segment_path
+
+    def run_ffmpeg(self, cmd: list[str], on_progress: Callable[[float], None]) -> float | None:
+        """Run one tracked ffmpeg process, forwarding progress; return the last ``speed=`` it reported."""
+        with self.ffmpeg_slots:
+            if self.cancel_event.is_set():
+                raise RuntimeError("导出已取消。")
+            process = subprocess.Popen(
+                cmd,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.STDOUT,
+                text=True,
+                bufsize=1,
+            )
+            with self.process_lock:
+                self.current_processes.add(process)
+            try:
+                assert process.stdout is not None
+                output_lines: deque[str] = deque(maxlen=FFMPEG_TAIL_LINES)
+                speed: float | None = None
+                for line in process.stdout:
+                    output_lines.append(line)
+                    progress_seconds = parse_progress_seconds(line)
+                    if progress_seconds is not None:
+                        on_progress(progress_seconds)
+                    elif line.startswith("speed="):
+                        speed = parse_progress_speed(line) or speed
+                return_code = process.wait()
+            finally:
+                with self.process_lock:
+                    self.current_processes.discard(process)
+
+        if self.cancel_event.is_set():
+            raise RuntimeError("导出已取消。")
+        if return_code != 0:
+            raise RuntimeError("ffmpeg 导出失败：\n" + "".join(output_lines))
+        return speed
+
+    def silence_cuts(self, group: RecordingGroup) -> list[tuple[float, float]]:
+        """Return the stretches of ``group``, in session seconds, that trimming leaves out."""
+        spans: list[list[tuple[float, float]]] = []
+        durations: list[float] = []
+        with self.stats.measure("analyze_silence", items=len(group.files)):
+            for audio_file in group.files:
+                if self.cancel_event.is_set():
+                    raise RuntimeError("导出已取消。")
+                file_spans, duration = self.file_silence(audio_file)
+                spans.append(file_spans)
+                durations.append(duration)
+        return session_silence_cuts(spans, durations, self.settings)
+
+    def file_silence(self, audio_file: AudioFile) -> tuple[list[tuple[float, float]], float]:
+        """Silent spans of one chunk and its exact length; chunks that cannot be analysed count as sound."""
+        threshold = self.settings.silence_threshold_db
+        try:
+            stat = audio_file.path.stat()
+            header = read_wav_header(audio_file.path)
+        except (OSError, ValueError):
+            return [], audio_file.duration
+        if self.span_cache is not None:
+            spans = self.span_cache.lookup_spans(audio_file.path, stat, threshold)
+            if spans is not None:
+                return spans, header.duration
+        try:
+            spans = analyze_silence(audio_file.path, header, threshold)
+        except (OSError, ValueError):
+            return [], header.duration
+        if self.span_cache is not None:
+            self.span_cache.store_spans(audio_file.path, stat, threshold, spans)
+        return spans, header.duration
+
+    def read_headers(self, group: RecordingGroup) -> list[WavHeader] | None:
+        try:
+            return [read_wav_header(audio_file.path) for audio_file in group.files]
+        except (OSError, ValueError):
+            return None
+
+    def concat_wav_files(
+        self,
+        group: RecordingGroup,
+        headers: list[WavHeader],
+        output_path: Path,
+        on_progress: Callable[[float], None],
+        cuts: list[tuple[float, float]] | None = None,
+    ) -> None:
+        """Join same-format WAV chunks without transcoding: one new header, then each data chunk copied as is.
+
+        With ``cuts``, only the frames outside those session-time stretches are copied.
+        """
+        # Trim every chunk to whole frames so a ragged tail cannot shift the channels of the next file.
+        ranges: list[list[tuple[int, int]]] = []
+        position = 0.0
+        for header in headers:
+            ranges.append(kept_frame_ranges(cuts or [], position, header.frame_count, header.sample_rate))
+            position += header.duration
+        block_align = headers[0].block_align
+        data_size = sum((end - start) * block_align for file_ranges in ranges for start, end in file_ranges)
+        bytes_per_second = headers[0].block_align * headers[0].sample_rate
+        written = 0
+
+        def on_copied(count: int) -> None:
+            nonlocal written
+            if self.cancel_event.is_set():
+                raise RuntimeError("导出已取消。")
+            written += count
+            on_progress(written / bytes_per_second)
+
+        with output_path.open("wb", buffering=0) as output:
+            write_wav_header(output, headers[0].fmt_chunk, data_size)
+            for audio_file, header, file_ranges in zip(group.files, headers, ranges):
+                for start, end in file_ranges:
+                    offset, size = header.data_offset + start * block_align, (end - start) * block_align
+                    if copy_file_data(audio_file.path, offset, size, output, on_copied) != size:
+                        raise RuntimeError(f"源文件读取不完整：{audio_file.path}")
+            if data_size & 1:
+                output.write(b"\0")
+
+    def remove_partial_output(self, path: Path) -> None:
+        try:
+            path.unlink()
+        except OSError:
+            pass
+
+    def cancel(self) -> None:
+        self.cancel_event.set()
+        self.terminate_processes()
+
+    def terminate_processes(self) -> None:
+        with self.process_lock:
+            processes = list(self.current_processes)
+        for process in processes:
+            if process.poll() is None:
+                process.terminate()
+
+
+def scaled_progress(on_progress: Callable[[float], None], factor: float) -> Callable[[float], None]:
+    return lambda seconds: on_progress(seconds * factor)
+
+
+def pcm_frames(buffer: mmap.mmap, offset: int, count: int, header: WavHeader) -> "np.ndarray":
+    """Decode ``count`` frames at ``offset`` into a float array of shape (frames, channels), full scale 1.0."""
+    channels = header.channels
+    width, remainder = divmod(header.block_align, channels)
+    sample_format = header.sample_format
+    if remainder:
+        raise ValueError("unsupported block alignment")
+    if sample_format == WAVE_FORMAT_IEEE_FLOAT and width in (4, 8):
+        samples = np.frombuffer(buffer, dtype=f"<f{width}", count=count * channels, offset=offset)
+    elif sample_format != WAVE_FORMAT_PCM:
+        raise ValueError("unsupported sample format")
+    elif width == 1:
+        samples = (np.frombuffer(buffer, dtype=np.uint8, count=count * channels, offset=offset) - 128.0) / 128.0
+    elif width in (2, 4):
+        raw = np.frombuffer(buffer, dtype=f"<i{width}", count=count * channels, offset=offset)
+        samples = raw / float(1 << (8 * width - 1))
+    elif width == 3:
+        raw = np.frombuffer(buffer, dtype=np.uint8, count=count * channels * 3, offset=offset).reshape(-1, 3)
+        # Sign-extend through the top byte; the two lower bytes are plain unsigned.
+        value = raw[:, 0].astype(np.int32) | raw[:, 1].astype(np.int32) << 8 | raw[:, 2].astype(np.int8).astype(np.int32) << 16
+        samples = value / float(1 << 23)
+    else:
+        raise ValueError("unsupported sample width")
+    return samples.reshape(-1, channels)
+
+
+def analyze_silence(path: Path, header: WavHeader, threshold_db: float) -> list[tuple[float, float]]:
+    """Return the silent stretches of a PCM or float WAV as ``(start, end)`` seconds.
+
+    The data chunk is mapped and decoded a block at a time. A window counts as silent when its RMS stays
+    under ``threshold_db`` dBFS and its peak under the threshold plus SILENCE_PEAK_MARGIN_DB.
+    """
+    if np is None:
+        raise RuntimeError("缺少 numpy 依赖，无法裁剪静音。请先运行 ./setup.sh。")
+    rate = header.sample_rate
+    window = max(1, round(SILENCE_WINDOW_SECONDS * rate))
+    block = max(1, ANALYSIS_BLOCK_FRAMES // window) * window
+    rms_limit = 10 ** (threshold_db / 20)
+    peak_limit = 10 ** ((threshold_db + SILENCE_PEAK_MARGIN_DB) / 20)
+
+    silent_parts = []
+    with path.open("rb") as handle:
+        size = os.fstat(handle.fileno()).st_size
+        frames = min(header.frame_count, max(0, size - header.data_offset) // header.block_align)
+        if frames <= 0:
+            return []
+        with mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            for first in range(0, frames, block):
+                count = min(block, frames - first)
+                samples = pcm_frames(mapped, header.data_offset + first * header.block_align, count, header)
+                starts = np.arange(0, count, window)
+                lengths = np.diff(np.append(starts, count))
+                # Channels are averaged for loudness, but any loud channel breaks the silence.
+                rms = np.sqrt(np.add.reduceat(np.mean(samples * samples, axis=1), starts) / lengths)
+                peak = np.maximum.reduceat(np.max(np.abs(samples), axis=1), starts)
+                silent_parts.append((rms <= rms_limit) & (peak <= peak_limit))
+                del samples
+
+    silent = np.concatenate(([False], *silent_parts, [False])).astype(np.int8)
+    edges = np.flatnonzero(np.diff(silent))
+    spans = []
+    for start, end in zip(edges[::2], edges[1::2]):
+        start_seconds, end_seconds = int(start) * window / rate, min(int(end) * window, frames) / rate
+        if end_seconds - start_seconds >= SILENCE_SPAN_MIN_SECONDS:
+            spans.append((round(start_seconds, 3), round(end_seconds, 3)))
+    return spans
+
+
+def compute_peaks(path: Path, header: WavHeader) -> "np.ndarray":
+    """Scan a PCM or float WAV once into int8 (min, max) pairs, one per PEAK_BUCKET_SECONDS, across all channels."""
+    bucket = max(1, round(PEAK_BUCKET_SECONDS * header.sample_rate))
+    block = max(1, ANALYSIS_BLOCK_FRAMES // bucket) * bucket
+    parts = []
+    with path.open("rb") as handle:
+        size = os.fstat(handle.fileno()).st_size
+        frames = min(header.frame_count, max(0, size - header.data_offset) // header.block_align)
+        if frames <= 0:
+            return np.zeros((0, 2), dtype=np.int8)
+        with mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            for first in range(0, frames, block):
+                count = min(block, frames - first)
+                samples = pcm_frames(mapped, header.data_offset + first * header.block_align, count, header)
+                starts = np.arange(0, count, bucket)
+                lows = np.minimum.reduceat(samples.min(axis=1), starts)
+                highs = np.maximum.reduceat(samples.max(axis=1), starts)
+                parts.append(np.stack([lows, highs], axis=1))
+                del samples
+    return np.clip(np.round(np.nan_to_num(np.concatenate(parts)) * 127), -127, 127).astype(np.int8)
+
+
+def file_peaks(audio_file: AudioFile, cache: PeakCache | None) -> "np.ndarray":
+    """Level-0 peaks of one chunk, sized to its probed duration so chunks line up on the session timeline."""
+    expected = max(0, round(audio_file.duration / PEAK_BUCKET_SECONDS))
+    try:
+        stat = audio_file.path.stat()
+        peaks = cache.lookup(audio_file.path, stat) if cache is not None else None
+        if peaks is None:
+            peaks = compute_peaks(audio_file.path, read_wav_header(audio_file.path))
+            if cache is not None:
+                cache.store(audio_file.path, stat, peaks)
+    except (OSError, ValueError):
+        # Unreadable or non-PCM chunks draw as a flat line instead of hiding the rest of the session.
+        peaks = np.zeros((0, 2), dtype=np.int8)
+    if len(peaks) >= expected:
+        return peaks[:expected]
+    return np.concatenate([peaks, np.zeros((expected - len(peaks), 2), dtype=np.int8)])
+
+
+def load_waveform(
+    group: RecordingGroup,
+    cache: PeakCache | None = None,
+    cancel_event: threading.Event | None = None,
+) -> Waveform | None:
+    """Build the session's peak pyramid, computing only chunks the cache does not have; None when cancelled."""
+    if np is None:
+        raise RuntimeError("缺少 numpy 依赖，无法显示波形。请先运行 ./setup.sh。")
+    chunks = []
+    offsets = [0.0]
+    for audio_file in group.files:
+        if cancel_event is not None and cancel_event.is_set():
+            return None
+        chunks.append(file_peaks(audio_file, cache))
+        offsets.append(offsets[-1] + len(chunks[-1]) * PEAK_BUCKET_SECONDS)
+    return Waveform(chunks, offsets)
+
+
+def session_silence_cuts(
+    spans: list[list[tuple[float, float]]],
+    durations: list[float],
+    settings: ExportSettings,
+) -> list[tuple[float, float]]:
+    """Merge per-chunk silent spans onto the session timeline and turn the long ones into cuts.
+
+    Spans that meet across a chunk boundary count as one. Each silence of at least ``min_silence_seconds``
+    keeps ``keep_silence_seconds`` of itself, split between its two edges, and the middle is cut.
+    """
+    merged: list[tuple[float, float]] = []
+    offset = 0.0
+    for file_spans, duration in zip(spans, durations):
+        for start, end in file_spans:
+            start, end = offset + start, offset + end
+            if merged and start - merged[-1][1] <= SILENCE_WINDOW_SECONDS:
+                merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+            else:
+                merged.append((start, end))
+        offset += duration
+
+    edge = settings.keep_silence_seconds / 2
+    return [
+        (start + edge, end - edge)
+        for start, end in merged
+        if end - start >= settings.min_silence_seconds and end - start > settings.keep_silence_seconds
+    ]
+
+
+def kept_frame_ranges(
+    cuts: list[tuple[float, float]],
+    start_seconds: float,
+    frame_count: int,
+    rate: int,
+) -> list[tuple[int, int]]:
+    """Frame ranges of a chunk starting at ``start_seconds`` in the session that no cut covers."""
+    ranges: list[tuple[int, int]] = []
+    position = 0
+    for cut_start, cut_end in cuts:
+        first = max(position, round((cut_start - start_seconds) * rate))
+        last = min(frame_count, round((cut_end - start_seconds) * rate))
+        if last <= first:
+            continue
+        if first > position:
+            ranges.append((position, first))
+        position = last
+    if position < frame_count:
+        ranges.append((position, frame_count))
+    return ranges
+
+
+def chunk_offsets(group: RecordingGroup, rate: int) -> list[int]:
+    """Start of every chunk in the joined session, in output samples, followed by the session length."""
+    offsets = [0]
+    position = 0.0
+    for audio_file in group.files:
+        position += audio_file.duration
+        offsets.append(round(position * rate))
+    return offsets
+
+
+def codec_frame_size(settings: ExportSettings) -> int:
+    # MPEG-2 Layer III, used below 32 kHz, packs half as many samples per frame.
+    if settings.format == "mp3" and settings.sample_rate < 32000:
+        return 576
+    return settings.preset["frame_size"]
+
+
+MP3_BITRATES_KBPS = {
+    1: (0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320),
+    2: (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160),
+}
+MP3_SAMPLE_RATES = {3: (44100, 48000, 32000), 2: (22050, 24000, 16000), 0: (11025, 12000, 8000)}
+# Samples an MP3 decoder outputs before the first encoded sample; the LAME tag's delay field excludes it.
+MP3_DECODER_DELAY = 529
+
+
+def codec_frame_length(header: bytes) -> int:
+    """Byte length of the ADTS or MPEG Layer III frame starting with ``header`` (at least 6 bytes)."""
+    if header[0] != 0xFF or header[1] & 0xE0 != 0xE0:
+        raise ValueError("lost frame sync")
+    if header[1] & 0x06 == 0 and header[1] & 0xF0 == 0xF0:
+        # ADTS: layer bits are always zero; the 13-bit frame length includes the header.
+        return ((header[3] & 0x03) << 11) | (header[4] << 3) | (header[5] >> 5)
+    version = (header[1] >> 3) & 0x03
+    if (header[1] >> 1) & 0x03 != 1:
+        raise ValueError("not a Layer III frame")
+    bitrate_index = header[2] >> 4
+    rate_index = (header[2] >> 2) & 0x03
+    if version == 1 or bitrate_index in (0, 15) or rate_index == 3:
+        raise ValueError("unsupported MPEG frame")
+    bitrate = MP3_BITRATES_KBPS[1 if version == 3 else 2][bitrate_index] * 1000
+    sample_rate = MP3_SAMPLE_RATES[version][rate_index]
+    padding = (header[2] >> 1) & 0x01
+    return (144 if version == 3 else 72) * bitrate // sample_rate + padding
+
+
+def copy_codec_frames(path: Path, output: BinaryIO, skip: int, keep: int | None) -> int:
+    """Copy frames ``skip`` .. ``skip + keep`` of a raw ADTS/MP3 stream (all remaining when ``keep`` is None)."""
+    copied = 0
+    index = 0
+    with path.open("rb") as source:
+        while keep is None or copied < keep:
+            header = source.read(6)
+            if len(header) < 6:
+                break
+            length = codec_frame_length(header)
+            if length < 7:
+                raise ValueError("invalid frame length")
+            body = source.read(length - 6)
+            if index >= skip:
+                output.write(header + body)
+                copied += 1
+            index += 1
+    return copied
+
+
+def mp3_info_frame(header: bytes, frames: int, frame_size: int, samples: int, delay: int, stream_bytes: int) -> bytes:
+    """A silent Xing/LAME "Info" frame for a CBR stream of ``frames`` frames starting with ``header``.
+
+    It carries the gapless fields a direct encode gets: ``delay`` priming samples (decoder delay included)
+    and the padding after the last of ``samples`` real samples.
+    """
+    version = (header[1] >> 3) & 0x03
+    rate_index = (header[2] >> 2) & 0x03
+    mono = header[3] >> 6 == 3
+    side = (17 if mono else 32) if version == 3 else (9 if mono else 17)
+    # Xing fields with a TOC and quality, then the 36-byte LAME extension.
+    needed = 4 + side + 120 + 36
+    for bitrate_index in range(1, 15):
+        # No CRC and no padding slot, so the frame length follows from the bitrate alone.
+        frame_header = bytes([0xFF, header[1] | 0x01, bitrate_index << 4 | rate_index << 2, header[3]])
+        length = codec_frame_length(frame_header + b"\0\0")
+        if length >= needed:
+            break
+    else:
+        raise ValueError("no bitrate leaves room for an Info frame")
+    encoder_delay = min(max(delay - MP3_DECODER_DELAY, 0), 4095)
+    padding = min(max(frames * frame_size - encoder_delay - samples, 0), 4095)
+    total_bytes = length + stream_bytes
+    bitrate_kbps = MP3_BITRATES_KBPS[1 if version == 3 else 2][header[2] >> 4]
+    tag = bytearray(frame_header + bytes(side) + b"Info")
+    tag += struct.pack(">III", 0x0F, frames, total_bytes)
+    tag += bytes(index * 256 // 100 for index in range(100))
+    tag += struct.pack(">I", 0)
+    tag += b"LAME3.100" + bytes([0x01, 0]) + bytes(8) + bytes([0, min(bitrate_kbps, 255)])
+    tag += (encoder_delay << 12 | padding).to_bytes(3, "big")
+    tag += bytes(4) + struct.pack(">IH", total_bytes, 0)
+    tag += struct.pack(">H", crc16_arc(bytes(tag)))
+    return bytes(tag) + bytes(length - len(tag))
+
+
+def crc16_arc(data: bytes) -> int:
+    """CRC-16/ARC, the checksum the LAME tag stores over the bytes before it."""
+    crc = 0
+    for byte in data:
+        crc ^= byte
+        for _bit in range(8):
+            crc = (crc >> 1) ^ 0xA001 if crc & 1 else crc >> 1
+    return crc
+
+
+def output_duration(path: Path) -> float:
+    """Duration of an exported file read from its container header alone; raises ValueError when unreadable."""
+    suffix = path.suffix.lower()
+    if suffix == ".wav":
+        return read_wav_header(path).duration
+    if suffix == ".m4a":
+        return mp4_duration(path)
+    if suffix == ".mp3":
+        return mp3_duration(path)
+    raise ValueError(f"no header check for {suffix} files")
+
+
+def mp4_boxes(handle: BinaryIO, start: int, end: int) -> Iterator[tuple[bytes, int, int]]:
+    """Yield ``(type, payload start, box end)`` of the boxes between ``start`` and ``end``."""
+    position = start
+    while position + 8 <= end:
+        handle.seek(position)
+        size, kind = struct.unpack(">I4s", handle.read(8))
+        header = 8
+        if size == 1:
+            size, header = struct.unpack(">Q", handle.read(8))[0], 16
+        elif size == 0:
+            size = end - position
+        if size < header or position + size > end:
+            raise ValueError(f"truncated {kind!r} box")
+        yield kind, position + header, position + size
+        position += size
+
+
+def mp4_duration(path: Path) -> float:
+    """Duration from the ``mdhd`` box of the first track, found by walking box headers only."""
+    with path.open("rb") as handle:
+        end = os.fstat(handle.fileno()).st_size
+        # Walking every top-level box also catches a file cut short behind a leading moov.
+        top_level = list(mp4_boxes(handle, 0, end))
+        boxes = top_level
+        for kind in (b"moov", b"trak", b"mdia", b"mdhd"):
+            match = next((box for box in boxes if box[0] == kind), None)
+            if match is None:
+                raise ValueError(f"no {kind.decode()} box")
+            _kind, start, end = match
+            if kind != b"mdhd":
+                boxes = list(mp4_boxes(handle, start, end))
+        handle.seek(start)
+        payload = handle.read(min(32, end - start))
+    if len(payload) >= 32 and payload[0] == 1:
+        timescale, duration = struct.unpack_from(">IQ", payload, 20)
+    elif len(payload) >= 20:
+        timescale, duration = struct.unpack_from(">II", payload, 12)
+    else:
+        raise ValueError("short mdhd box")
+    if not timescale:
+        raise ValueError("mdhd without timescale")
+    return duration / timescale
+
+
+def mp3_duration(path: Path) -> float:
+    """Duration from the Xing/Info frame ffmpeg writes first, or from the bitrate when there is none."""
+    with path.open("rb") as handle:
+        file_size = os.fstat(handle.fileno()).st_size
+        tag = handle.read(10)
+        offset = 0
+        if tag[:3] == b"ID3" and len(tag) == 10:
+            offset = 10 + ((tag[6] & 0x7F) << 21 | (tag[7] & 0x7F) << 14 | (tag[8] & 0x7F) << 7 | (tag[9] & 0x7F))
+        handle.seek(offset)
+        frame = handle.read(64)
+    if len(frame) < 64:
+        raise ValueError("no MPEG frame")
+    codec_frame_length(frame)
+    version = (frame[1] >> 3) & 0x03
+    sample_rate = MP3_SAMPLE_RATES[version][(frame[2] >> 2) & 0x03]
+    mono = frame[3] >> 6 == 3
+    # The Xing/Info tag sits right after the side information, whose size depends on version and channels.
+    side = (17 if mono else 32) if version == 3 else (9 if mono else 17)
+    if frame[4 + side : 8 + side] in (b"Xing", b"Info"):
+        flags = struct.unpack_from(">I", frame, 8 + side)[0]
+        fields = iter(struct.unpack_from(">II", frame, 12 + side))
+        frames = next(fields) if flags & 0x01 else None
+        if flags & 0x02 and file_size - offset < next(fields):
+            raise ValueError("stream shorter than its Info frame says")
+        if frames is not None:
+            return frames * (1152 if version == 3 else 576) / sample_rate
+    bitrate = MP3_BITRATES_KBPS[1 if version == 3 else 2][frame[2] >> 4] * 1000
+    return (file_size - offset) * 8 / bitrate
+
+
+def quarantine_outputs(paths: list[Path], names: list[str], folder: Path) -> list[Path]:
+    """Move the files that exist among ``paths`` into ``folder`` under ``names``, never overwriting."""
+    moved: list[Path] = []
+    for path, name in zip(paths, names):
+        if not path.exists():
+            continue
+        folder.mkdir(parents=True, exist_ok=True)
+        target = unique_output_path(folder / name)
+        os.replace(path, target)
+        moved.append(target)
+    return moved
+
+
+def move_paths_to_trash(paths: list[Path]) -> None:
+    existing_paths = [path for path in paths if path.exists()]
+    if send2trash is None:
+        raise RuntimeError("缺少 send2trash 依赖，请先运行 ./setup.sh。")
+
+    # One call for the whole list: on macOS each call is a round trip to Finder.
+    if existing_paths:
+        send2trash([str(path) for path in existing_paths])
+
+
+def output_name_for_group(group: RecordingGroup, settings: ExportSettings) -> str:
+    return sanitize_filename(group.title) + settings.preset["extension"]
+
+
+def reserve_output_paths(
+    output_folder: Path, group: RecordingGroup, variants: list[ExportSettings], reserved: set[Path]
+) -> list[Path]:
+    """One free path per format, all sharing a stem (numbered like ``unique_output_path``) so they sort together."""
+    stem = sanitize_filename(group.title)
+    counter = 1
+    while True:
+        name = stem if counter == 1 else f"{stem}-{counter}"
+        paths = [output_folder / (name + variant.preset["extension"]) for variant in variants]
+        if all(not path.exists() and path not in reserved for path in paths):
+            return paths
+        counter += 1
+
+
+def session_fingerprint(group: RecordingGroup, settings: ExportSettings) -> str:
+    """Identify a session export by its member files (path, size, mtime) and the encoder settings."""
+    members = []
+    for audio_file in group.files:
+        try:
+            stat = audio_file.path.stat()
+            members.append([str(audio_file.path), stat.st_size, stat.st_mtime_ns])
+        except OSError:
+            members.append([str(audio_file.path), audio_file.size, 0])
+    payload = json.dumps([members, vars(settings)], sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def partial_output_path(path: Path) -> Path:
+    # Keep the real extension last so ffmpeg still picks the right muxer.
+    return path.with_name(f".{path.stem}.partial{path.suffix}")
+
+
+def unique_output_path(path: Path, reserved: set[Path] | None = None) -> Path:
+    reserved = reserved or set()
+    if not path.exists() and path not in reserved:
+        return path
+    stem = path.stem
+    suffix = path.suffix
+    parent = path.parent
+    counter = 2
+    while True:
+        candidate = parent / f"{stem}-{counter}{suffix}"
+        if not candidate.exists() and candidate not in reserved:
+            return candidate
+        counter += 1
+
+
+def parse_progress_seconds(line: str) -> float | None:
+    if line.startswith("out_time_ms=") or line.startswith("out_time_us="):
+        try:
+            return int(line.split("=", 1)[1]) / 1_000_000
+        except ValueError:
+            return None
+    if line.startswith("out_time="):
+        value = line.split("=", 1)[1].strip()
+        try:
+            hours, minutes, seconds = value.split(":")
+            return int(hours) * 3600 + int(minutes) * 60 + float(seconds)
+        except ValueError:
+            return None
+    return None
+
+
+def parse_progress_speed(line: str) -> float | None:
+    """Read ffmpeg's ``speed=12.3x`` progress key; ``N/A`` and malformed values give None."""
+    value = line.split("=", 1)[1].strip().rstrip("x")
+    try:
+        return float(value)
+    except ValueError:
+        return None
+
+
+def escape_concat_path(path: Path) -> str:
+    return str(path).replace("'", "'\\''")
+
+
+def sanitize_filename(name: str) -> str:
+    cleaned = re.sub(r"[\\/:*?\"<>|]+", "-", name)
+    cleaned = re.sub(r"\s+", "_", cleaned).strip("._-")
+    return cleaned or "recording"
@@ -0,0 +1,1358 @@
+"""
+Tkinter desktop interface for the DJI Mic recording organizer.
+"""
+
+from __future__ import annotations
+
+import math
+import queue
+import threading
+import time
+from bisect import bisect_right
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Iterator
+from tkinter import filedialog, messagebox, ttk
+import tkinter as tk
+
+from wav_merger_core import (
+    DEFAULT_EXPORT_WORKERS,
+    DEFAULT_SCAN_IGNORE,
+    EXPORT_CACHE_LIMIT,
+    FORMAT_PRESETS,
+    INSPECT_STAGES,
+    AudioFile,
+    DuplicateIndex,
+    ExportCache,
+    Exporter,
+    ExportResult,
+    ExportSettings,
+    GroupSplice,
+    PeakCache,
+    RUN_LOG_PATH,
+    RecordingGroup,
+    RunStats,
+    ScanCache,
+    Scanner,
+    SessionIndex,
+    Waveform,
+    iter_wav_files,
+    load_config,
+    load_waveform,
+    locate_ffmpeg,
+    move_paths_to_trash,
+    output_name_for_group,
+    save_config,
+)
+
+
+APP_TITLE = "DJI Mic 录音整理工具"
+# Virtual event worker threads raise to wake the Tk loop when work_queue has messages.
+WORK_QUEUED_EVENT = "<<WorkQueued>>"
+# Only the newest of these messages in one drain matters; older ones are dropped unseen.
+LATEST_ONLY_MESSAGES = {"progress", "scan_progress"}
+# Fallback when the theme does not report a Treeview row height.
+DEFAULT_ROW_HEIGHT = 20
+# Shift and Control bits of a Tk event state: clicks with these extend the selection.
+EXTEND_SELECTION_MASK = 0x0001 | 0x0004
+WAVEFORM_HEIGHT = 84
+# One wheel notch zooms the waveform by this factor; the view never narrows below WAVEFORM_MIN_SPAN seconds.
+WAVEFORM_ZOOM_STEP = 1.25
+WAVEFORM_MIN_SPAN = 1.0
+# A press that moves fewer pixels than this before release is a click, not a drag.
+CLICK_SLOP = 3
+# Gap histogram bin edges in seconds: [0, 1), then four bins per decade up to about 28 hours and one beyond.
+GAP_HISTOGRAM_EDGES = [0.0] + [10 ** (step / 4) for step in range(21)]
+GAP_HISTOGRAM_SIZE = (168, 22)
+
+
+class VirtualTreeview:
+    """A Treeview that only materializes the rows currently in view.
+
+    Rows are addressed by integer index and their values are pulled from ``row_values`` on demand, so a
+    library with thousands of sessions costs one page of widget rows. Selection is kept as a set of
+    indices and survives scrolling and splices without round-tripping through item ids.
+    """
+
+    def __init__(
+        self,
+        parent: tk.Misc,
+        columns: tuple[str, ...],
+        row_count: Callable[[], int],
+        row_values: Callable[[int], tuple],
+        on_select: Callable[[], None] | None = None,
+    ) -> None:
+        self.row_count = row_count
+        self.row_values = row_values
+        self.on_select = on_select
+        self.tree = ttk.Treeview(parent, columns=columns, show="headings", selectmode="extended")
+        self.scrollbar = ttk.Scrollbar(parent, orient=tk.VERTICAL, command=self.on_scroll)
+        self.top = 0
+        self.page = int(self.tree.cget("height") or 10)
+        self.extend_selection = False
+        self.clicked = False
+        # Slot ids last selected by sync_tree_selection, to tell its <<TreeviewSelect>> echoes from clicks.
+        self.synced: set[str] = set()
+        self.slot_values: list[tuple] = []
+        self.selected: set[int] = set()
+        self.row_height = self.lookup_row_height()
+
+        self.tree.bind("<<TreeviewSelect>>", self.on_tree_select)
+        self.tree.bind("<ButtonPress-1>", self.on_button_press, add="+")
+        self.tree.bind("<Configure>", self.on_configure)
+        self.tree.bind("<MouseWheel>", self.on_mouse_wheel)
+        self.tree.bind("<Button-4>", lambda _event: self.scroll_by(-3))
+        self.tree.bind("<Button-5>", lambda _event: self.scroll_by(3))
+        self.tree.bind("<Up>", lambda _event: self.step_selection(-1))
+        self.tree.bind("<Down>", lambda _event: self.step_selection(1))
+        self.tree.bind("<Prior>", lambda _event: self.scroll_by(-self.page))
+        self.tree.bind("<Next>", lambda _event: self.scroll_by(self.page))
+
+    def lookup_row_height(self) -> int:
+        try:
+            return int(ttk.Style().lookup("Treeview", "rowheight")) or DEFAULT_ROW_HEIGHT
+        except (tk.TclError, ValueError, TypeError):
+            return DEFAULT_ROW_HEIGHT
+
+    def refresh(self) -> None:
+        """Re-render the visible window, rewriting only slots whose values changed."""
+        total = self.row_count()
+        self.top = max(0, min(self.top, total - self.page))
+        visible = max(0, min(self.page, total - self.top))
+
+        while len(self.slot_values) > visible:
+            self.tree.delete(f"slot{len(self.slot_values) - 1}")
+            self.slot_values.pop()
+        for slot in range(visible):
+            values = self.row_values(self.top + slot)
+            if slot == len(self.slot_values):
+                self.tree.insert("", tk.END, iid=f"slot{slot}", values=values)
+                self.slot_values.append(values)
+            elif self.slot_values[slot] != values:
+                self.tree.item(f"slot{slot}", values=values)
+                self.slot_values[slot] = values
+
+        self.sync_tree_selection()
+        if total:
+            self.scrollbar.set(self.top / total, min(1.0, (self.top + visible) / total))
+        else:
+            self.scrollbar.set(0.0, 1.0)
+
+    def reset(self) -> None:
+        self.top = 0
+        self.selected.clear()
+        self.refresh()
+
+    def apply_splices(self, splices: list[GroupSplice]) -> None:
+        """Shift the selection through ``groups[index:index + removed] = inserted`` edits, then redraw."""
+        for splice in splices:
+            shift = splice.inserted - splice.removed
+            end = splice.index + splice.removed
+            remapped: set[int] = set()
+            for index in self.selected:
+                if index < splice.index:
+                    remapped.add(index)
+                elif index >= end:
+                    remapped.add(index + shift)
+                elif splice.inserted:
+                    remapped.add(min(index, splice.index + splice.inserted - 1))
+            self.selected = remapped
+        self.refresh()
+
+    def selected_indices(self) -> list[int]:
+        return sorted(self.selected)
+
+    def set_selection(self, indices: list[int]) -> None:
+        total = self.row_count()
+        self.selected = {index for index in indices if 0 <= index < total}
+        if self.selected:
+            self.see(min(self.selected))
+        self.refresh()
+
+    def see(self, index: int) -> None:
+        if index < self.top:
+            self.top = index
+        elif index >= self.top + self.page:
+            self.top = index - self.page + 1
+
+    def sync_tree_selection(self) -> None:
+        wanted = [f"slot{index - self.top}" for index in self.selected if 0 <= index - self.top < len(self.slot_values)]
+        self.synced = set(wanted)
+        if self.synced != set(self.tree.selection()):
+            self.tree.selection_set(wanted)
+
+    def on_button_press(self, event: tk.Event) -> None:
+        self.extend_selection = bool(event.state & EXTEND_SELECTION_MASK)
+        self.clicked = True
+
+    def on_tree_select(self, _event: tk.Event) -> None:
+        clicked, self.clicked = self.clicked, False
+        # Tk also reports selections made from code, after the fact; only clicks may change ``selected``.
+        if not clicked and set(self.tree.selection()) == self.synced:
+            return
+        visible = range(self.top, self.top + len(self.slot_values))
+        chosen = {self.top + int(item[4:]) for item in self.tree.selection() if item.startswith("slot")}
+        # A plain click replaces the selection; Shift/Ctrl clicks keep rows scrolled out of view.
+        kept = {index for index in self.selected if index not in visible} if self.extend_selection else set()
+        self.extend_selection = False
+        selected = kept | chosen
+        if selected != self.selected:
+            self.selected = selected
+            if self.on_select:
+                self.on_select()
+
+    def on_configure(self, event: tk.Event) -> None:
+        # Leave room for the heading row; one extra row keeps the bottom edge filled.
+        page = max(1, (event.height - self.row_height) // self.row_height + 1)
+        if page != self.page:
+            self.page = page
+            self.refresh()
+
+    def on_scroll(self, *args: str) -> None:
+        total = self.row_count()
+        if args[0] == "moveto":
+            self.top = int(float(args[1]) * total)
+        elif args[0] == "scroll":
+            step = int(args[1]) * (self.page if args[2] == "pages" else 1)
+            self.top += step
+        self.refresh()
+
+    def on_mouse_wheel(self, event: tk.Event) -> str:
+        self.scroll_by(-1 * (event.delta // 120 or (1 if event.delta > 0 else -1)) * 3)
+        return "break"
+
+    def scroll_by(self, rows: int) -> str:
+        self.top += rows
+        self.refresh()
+        return "break"
+
+    def step_selection(self, step: int) -> str:
+        total = self.row_count()
+        if not total or str(self.tree.cget("selectmode")) == "none":
+            return "break"
+        current = self.selected_indices()
+        anchor = (current[-1] if step > 0 else current[0]) if current else self.top - step
+        target = max(0, min(total - 1, anchor + step))
+        self.set_selection([target])
+        if self.on_select:
+            self.on_select()
+        return "break"
+
+
+class WaveformView:
+    """Canvas strip that draws a session's peak pyramid, zoomed with the wheel and panned by dragging.
+
+    Chunk boundaries are marked and the selected chunks shaded; a click reports the chunk under the cursor
+    through ``on_pick``. Every redraw reads the pyramid only, never the audio.
+    """
+
+    def __init__(self, parent: tk.Misc, on_pick: Callable[[int], None]) -> None:
+        self.on_pick = on_pick
+        self.canvas = tk.Canvas(parent, height=WAVEFORM_HEIGHT, background="#fafafa", highlightthickness=0)
+        self.waveform: Waveform | None = None
+        self.message = ""
+        self.start = 0.0
+        self.end = 0.0
+        self.highlight: tuple[float, float] | None = None
+        self.press_x: int | None = None
+        self.press_start = 0.0
+
+        self.canvas.bind("<Configure>", lambda _event: self.redraw())
+        self.canvas.bind("<MouseWheel>", lambda event: self.zoom(event.x, event.delta > 0))
+        self.canvas.bind("<Button-4>", lambda event: self.zoom(event.x, True))
+        self.canvas.bind("<Button-5>", lambda event: self.zoom(event.x, False))
+        self.canvas.bind("<ButtonPress-1>", self.on_press)
+        self.canvas.bind("<B1-Motion>", self.on_drag)
+        self.canvas.bind("<ButtonRelease-1>", self.on_release)
+
+    def show(self, waveform: Waveform) -> None:
+        self.waveform = waveform
+        self.message = ""
+        self.start, self.end = 0.0, waveform.duration
+        self.redraw()
+
+    def show_message(self, text: str) -> None:
+        self.waveform = None
+        self.message = text
+        self.highlight = None
+        self.redraw()
+
+    def set_highlight(self, indices: list[int]) -> None:
+        offsets = self.waveform.offsets if self.waveform else []
+        valid = [index for index in indices if 0 <= index < len(offsets) - 1]
+        self.highlight = (offsets[min(valid)], offsets[max(valid) + 1]) if valid else None
+        self.redraw()
+
+    def width(self) -> int:
+        return max(1, int(self.canvas.winfo_width()))
+
+    def time_at(self, x: float) -> float:
+        return self.start + (self.end - self.start) * x / self.width()
+
+    def x_at(self, seconds: float) -> float:
+        span = self.end - self.start
+        return (seconds - self.start) / span * self.width() if span > 0 else 0.0
+
+    def redraw(self) -> None:
+        self.canvas.delete("all")
+        width, height = self.width(), max(1, int(self.canvas.winfo_height()))
+        if self.waveform is None or self.waveform.duration <= 0:
+            if self.message:
+                self.canvas.create_text(width / 2, height / 2, text=self.message, fill="#888888")
+            return
+
+        if self.highlight is not None:
+            left, right = (self.x_at(value) for value in self.highlight)
+            self.canvas.create_rectangle(left, 0, right, height, fill="#dce8f5", outline="")
+        for offset in self.waveform.offsets[1:-1]:
+            if self.start < offset < self.end:
+                x = self.x_at(offset)
+                self.canvas.create_line(x, 0, x, height, fill="#c8c8c8")
+
+        middle, scale = height / 2, height / 2 - 2
+        top: list[float] = []
+        bottom: list[float] = []
+        for x, (low, high) in enumerate(self.waveform.columns(self.start, self.end, width).tolist()):
+            if math.isnan(low):
+                continue
+            upper = middle - high * scale
+            top.extend((x, upper))
+            bottom.extend((x, max(upper + 1, middle - low * scale)))
+        if top:
+            # One polygon, upper envelope out and lower envelope back, is far cheaper than a line per column.
+            points = top + [value for index in range(len(bottom) - 2, -1, -2) for value in bottom[index : index + 2]]
+            self.canvas.create_polygon(points, fill="#4a7fb5", outline="#4a7fb5")
+
+        for x, anchor, seconds in ((3, tk.NW, self.start), (width - 3, tk.NE, self.end)):
+            self.canvas.create_text(x, 2, anchor=anchor, text=format_offset(seconds), fill="#666666")
+
+    def zoom(self, x: int, zoom_in: bool) -> str:
+        if self.waveform is None:
+            return "break"
+        duration = self.waveform.duration
+        span = self.end - self.start
+        new_span = span / WAVEFORM_ZOOM_STEP if zoom_in else span * WAVEFORM_ZOOM_STEP
+        new_span = max(min(WAVEFORM_MIN_SPAN, duration), min(duration, new_span))
+        # Keep the time under the cursor fixed while the scale changes.
+        anchor = self.time_at(x)
+        self.set_view(anchor - (anchor - self.start) * new_span / span, new_span)
+        return "break"
+
+    def set_view(self, start: float, span: float) -> None:
+        assert self.waveform is not None
+        self.start = max(0.0, min(start, self.waveform.duration - span))
+        self.end = self.start + span
+        self.redraw()
+
+    def on_press(self, event: tk.Event) -> None:
+        self.press_x = event.x
+        self.press_start = self.start
+
+    def on_drag(self, event: tk.Event) -> None:
+        if self.waveform is None or self.press_x is None:
+            return
+        span = self.end - self.start
+        self.set_view(self.press_start + (self.press_x - event.x) * span / self.width(), span)
+
+    def on_release(self, event: tk.Event) -> None:
+        pressed, self.press_x = self.press_x, None
+        if self.waveform is None or pressed is None or abs(event.x - pressed) >= CLICK_SLOP:
+            return
+        offsets = self.waveform.offsets
+        index = bisect_right(offsets, self.time_at(event.x)) - 1
+        self.on_pick(max(0, min(index, len(offsets) - 2)))
+
+
+class GapHistogram:
+    """Small log-scale histogram of the gaps between files, with the current threshold marked.
+
+    Clicking or dragging on it picks the threshold under the cursor through ``on_pick``, in seconds.
+    """
+
+    def __init__(self, parent: tk.Misc, on_pick: Callable[[float], None]) -> None:
+        self.on_pick = on_pick
+        width, height = GAP_HISTOGRAM_SIZE
+        self.canvas = tk.Canvas(parent, width=width, height=height, background="#fafafa", highlightthickness=0)
+        self.counts: list[int] = []
+        self.threshold = 0.0
+        self.canvas.bind("<ButtonPress-1>", lambda event: self.on_pick(self.seconds_at(event.x)))
+        self.canvas.bind("<B1-Motion>", lambda event: self.on_pick(self.seconds_at(event.x)))
+
+    def bin_width(self) -> float:
+        # One bin per edge: the last one is open-ended.
+        return GAP_HISTOGRAM_SIZE[0] / len(GAP_HISTOGRAM_EDGES)
+
+    def x_at(self, seconds: float) -> float:
+        # Bin 0 is linear over [0, 1) s; every later bin is a quarter decade.
+        position = seconds if seconds < 1 else 1 + 4 * math.log10(seconds)
+        return max(0.0, min(GAP_HISTOGRAM_SIZE[0], position * self.bin_width()))
+
+    def seconds_at(self, x: float) -> float:
+        position = max(0.0, x / self.bin_width())
+        return position if position < 1 else 10 ** ((position - 1) / 4)
+
+    def show(self, counts: list[int], threshold: float) -> None:
+        self.counts = counts
+        self.threshold = threshold
+        self.redraw()
+
+    def redraw(self) -> None:
+        self.canvas.delete("all")
+        width, height = GAP_HISTOGRAM_SIZE
+        tallest = math.log1p(max(self.counts, default=0))
+        bin_width = self.bin_width()
+        for index, count in enumerate(self.counts):
+            if count:
+                # Log heights keep a handful of long breaks visible next to thousands of chunk joins.
+                bar = max(1.0, (height - 2) * math.log1p(count) / tallest)
+                left = index * bin_width
+                # Gaps in blue bins start a new session at the current threshold (only gaps above it split).
+                # Bin 0 also holds the overlaps, which never split, so it is never blue.
+                splits = GAP_HISTOGRAM_EDGES[index] > self.threshold
+                self.canvas.create_rectangle(
+                    left + 1, height - bar, left + bin_width, height, fill="#4a7fb5" if splits else "#b0b0b0", outline=""
+                )
+        x = self.x_at(self.threshold)
+        self.canvas.create_line(x, 0, x, height, fill="#d04040")
+
+
+def format_offset(seconds: float) -> str:
+    minutes, seconds = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours}:{minutes:02d}:{seconds:02d}" if hours else f"{minutes}:{seconds:02d}"
+
+
+class WavMergerApp:
+    def __init__(self) -> None:
+        self.root = tk.Tk()
+        self.root.title(APP_TITLE)
+        self.root.geometry("1180x760")
+        self.root.minsize(980, 640)
+
+        self.config = load_config()
+        self.ffmpeg = locate_ffmpeg()
+        self.scan_cache = ScanCache()
+        # Opened on the first export that uses it, so turning the cache off never creates its folder.
+        self.export_cache: ExportCache | None = None
+        self.peak_cache = PeakCache()
+        self.scanner = Scanner(self.ffmpeg, self.scan_cache)
+
+        self.audio_files: list[AudioFile] = []
+        # Copies of chunks already in audio_files, found under another path; they never reach the sessions.
+        self.duplicate_index = DuplicateIndex()
+        self.selected_folder = tk.StringVar(value=self.config.get("last_folder", ""))
+        self.output_folder = tk.StringVar(value=self.config.get("output_folder", ""))
+        self.threshold_minutes = tk.StringVar(value=str(self.config.get("threshold_minutes", 2)))
+        self.threshold_preview = tk.StringVar(value="")
+        self.session_index = SessionIndex(self.get_threshold_minutes())
+        self.format_choice = tk.StringVar(value=self.normalize_format_key(self.config.get("format", "m4a")))
+        self.format_label = tk.StringVar()
+        # Formats written alongside the main one from the same read of the sources.
+        extra_formats = set(self.config.get("extra_formats", []))
+        self.extra_formats = {key: tk.BooleanVar(value=key in extra_formats) for key in FORMAT_PRESETS}
+        self.bitrate = tk.StringVar(value=self.config.get("bitrate", "64"))
+        self.mix_to_mono = tk.BooleanVar(value=self.config.get("mix_to_mono", True))
+        self.recursive_scan = tk.BooleanVar(value=self.config.get("recursive_scan", True))
+        # Folder-name globs the scan never enters; edited in the config file.
+        self.scan_ignore = list(self.config.get("scan_ignore", DEFAULT_SCAN_IGNORE))
+        self.export_selected_only = tk.BooleanVar(value=False)
+        self.delete_sources_after_export = tk.BooleanVar(value=self.config.get("delete_sources_after_export", False))
+        self.resume_export = tk.BooleanVar(value=self.config.get("resume_export", False))
+        self.trim_silence = tk.BooleanVar(value=self.config.get("trim_silence", False))
+        self.stage_sources = tk.BooleanVar(value=self.config.get("stage_sources", False))
+        self.use_export_cache = tk.BooleanVar(value=self.config.get("export_cache", True))
+        self.export_cache_limit = tk.StringVar(
+            value=f"{self.config.get('export_cache_limit_gb', EXPORT_CACHE_LIMIT / 1024**3):g}"
+        )
+        # The silence limits have no controls of their own; they come from the config file or the CLI defaults.
+        defaults = ExportSettings()
+        self.silence_limits = {
+            "silence_threshold_db": self.config.get("silence_threshold_db", defaults.silence_threshold_db),
+            "min_silence_seconds": self.config.get("min_silence_seconds", defaults.min_silence_seconds),
+            "keep_silence_seconds": self.config.get("keep_silence_seconds", defaults.keep_silence_seconds),
+        }
+        self.export_workers = tk.StringVar(value=str(self.config.get("export_workers", DEFAULT_EXPORT_WORKERS)))
+        self.status_text = tk.StringVar(value="请选择 DJI Mic 录音文件夹。")
+        self.progress_text = tk.StringVar(value="")
+        self.timing_text = tk.StringVar(value="")
+        self.progress_value = tk.DoubleVar(value=0)
+        self.work_queue: queue.Queue[tuple[str, object]] = queue.Queue()
+        self.wakeup_pending = threading.Event()
+        self.is_exporting = False
+        self.is_scanning = False
+        self.scan_cancel_event = threading.Event()
+        self.exporter: Exporter | None = None
+        self.file_view_group: RecordingGroup | None = None
+        self.waveform_cancel = threading.Event()
+
+        self.build_ui()
+        self.update_format_controls()
+        self.update_button_states()
+        self.root.protocol("WM_DELETE_WINDOW", self.on_close)
+        self.root.bind(WORK_QUEUED_EVENT, lambda _event: self.drain_work_queue())
+
+        if not self.ffmpeg:
+            self.status_text.set("未找到 ffmpeg。请先运行 setup.sh，或用 Homebrew 安装 ffmpeg。")
+
+    @property
+    def groups(self) -> list[RecordingGroup]:
+        return self.session_index.groups
+
+    def save_config(self) -> None:
+        data = {
+            "last_folder": self.selected_folder.get(),
+            "output_folder": self.output_folder.get(),
+            "threshold_minutes": self.get_threshold_minutes(),
+            "format": self.format_choice.get(),
+            "extra_formats": [key for key, selected in self.extra_formats.items() if selected.get()],
+            "bitrate": self.bitrate.get(),
+            "mix_to_mono": self.mix_to_mono.get(),
+            "recursive_scan": self.recursive_scan.get(),
+            "scan_ignore": self.scan_ignore,
+            "delete_sources_after_export": self.delete_sources_after_export.get(),
+            "resume_export": self.resume_export.get(),
+            "trim_silence": self.trim_silence.get(),
+            "stage_sources": self.stage_sources.get(),
+            "export_cache": self.use_export_cache.get(),
+            "export_cache_limit_gb": self.get_export_cache_limit() / 1024**3,
+            **self.silence_limits,
+            "export_workers": self.get_export_workers(),
+        }
+        save_config(data)
+
+    def build_ui(self) -> None:
+        self.root.columnconfigure(0, weight=1)
+        self.root.rowconfigure(1, weight=1)
+
+        top = ttk.Frame(self.root, padding=(12, 12, 12, 8))
+        top.grid(row=0, column=0, sticky="ew")
+        top.columnconfigure(1, weight=1)
+
+        ttk.Button(top, text="选择文件夹", command=self.choose_folder).grid(row=0, column=0, padx=(0, 8))
+        ttk.Entry(top, textvariable=self.selected_folder).grid(row=0, column=1, sticky="ew")
+        self.scan_button = ttk.Button(top, text="扫描", command=self.toggle_scan)
+        self.scan_button.grid(row=0, column=2, padx=(8, 0))
+        ttk.Button(top, text="添加文件", command=self.add_files).grid(row=0, column=3, padx=(8, 0))
+        ttk.Button(top, text="重建索引", command=lambda: self.scan_selected_folder(rebuild_cache=True)).grid(
+            row=0, column=4, padx=(8, 0)
+        )
+
+        ttk.Checkbutton(top, text="包含子文件夹", variable=self.recursive_scan).grid(row=1, column=0, sticky="w", pady=(8, 0))
+        gap_row = ttk.Frame(top)
+        gap_row.grid(row=1, column=1, sticky="e", pady=(8, 0))
+        ttk.Label(gap_row, textvariable=self.threshold_preview, foreground="#666666").pack(side=tk.LEFT, padx=(0, 8))
+        self.gap_histogram = GapHistogram(gap_row, on_pick=self.on_gap_histogram_pick)
+        self.gap_histogram.canvas.pack(side=tk.LEFT, padx=(0, 8))
+        ttk.Label(gap_row, text="分组间隔").pack(side=tk.LEFT, padx=(0, 8))
+        threshold = ttk.Combobox(top, textvariable=self.threshold_minutes, values=["0.5", "1", "2", "5", "10"], width=8)
+        threshold.grid(row=1, column=2, sticky="w", pady=(8, 0))
+        ttk.Label(top, text="分钟").grid(row=1, column=3, sticky="w", pady=(8, 0), padx=(6, 0))
+        self.threshold_minutes.trace_add("write", lambda *_args: self.update_threshold_preview())
+
+        body = ttk.PanedWindow(self.root, orient=tk.HORIZONTAL)
+        body.grid(row=1, column=0, sticky="nsew", padx=12, pady=(0, 8))
+
+        left = ttk.Frame(body)
+        right = ttk.Frame(body)
+        body.add(left, weight=3)
+        body.add(right, weight=2)
+
+        left.rowconfigure(1, weight=1)
+        left.columnconfigure(0, weight=1)
+        right.rowconfigure(1, weight=1)
+        right.columnconfigure(0, weight=1)
+
+        group_toolbar = ttk.Frame(left)
+        group_toolbar.grid(row=0, column=0, sticky="ew", pady=(0, 6))
+        ttk.Label(group_toolbar, text="录音会话").pack(side=tk.LEFT)
+        ttk.Button(group_toolbar, text="删除选中会话源文件", command=self.delete_selected_groups_from_disk).pack(side=tk.RIGHT, padx=(6, 0))
+        ttk.Button(group_toolbar, text="重新分组", command=self.regroup_files).pack(side=tk.RIGHT, padx=(6, 0))
+        ttk.Button(group_toolbar, text="合并选中组", command=self.merge_selected_groups).pack(side=tk.RIGHT, padx=(6, 0))
+
+        group_columns = ("index", "start", "files", "duration", "size", "output")
+        self.group_view = VirtualTreeview(
+            left,
+            group_columns,
+            row_count=lambda: len(self.groups),
+            row_values=self.group_row_values,
+            on_select=self.on_group_select,
+        )
+        self.group_tree = self.group_view.tree
+        self.group_tree.heading("index", text="#")
+        self.group_tree.heading("start", text="开始时间")
+        self.group_tree.heading("files", text="文件数")
+        self.group_tree.heading("duration", text="时长")
+        self.group_tree.heading("size", text="原始大小")
+        self.group_tree.heading("output", text="输出文件名")
+        self.group_tree.column("index", width=48, anchor=tk.CENTER, stretch=False)
+        self.group_tree.column("start", width=150, anchor=tk.W, stretch=False)
+        self.group_tree.column("files", width=72, anchor=tk.CENTER, stretch=False)
+        self.group_tree.column("duration", width=92, anchor=tk.CENTER, stretch=False)
+        self.group_tree.column("size", width=96, anchor=tk.E, stretch=False)
+        self.group_tree.column("output", width=260, anchor=tk.W)
+        self.group_tree.grid(row=1, column=0, sticky="nsew")
+        self.group_view.scrollbar.grid(row=1, column=1, sticky="ns")
+
+        export_panel = ttk.LabelFrame(left, text="导出设置", padding=10)
+        export_panel.grid(row=2, column=0, columnspan=2, sticky="ew", pady=(8, 0))
+        export_panel.columnconfigure(1, weight=1)
+
+        ttk.Label(export_panel, text="输出目录").grid(row=0, column=0, sticky="w")
+        ttk.Entry(export_panel, textvariable=self.output_folder).grid(row=0, column=1, sticky="ew", padx=8)
+        ttk.Button(export_panel, text="选择", command=self.choose_output_folder).grid(row=0, column=2)
+
+        ttk.Label(export_panel, text="格式").grid(row=1, column=0, sticky="w", pady=(8, 0))
+        self.format_combo = ttk.Combobox(
+            export_panel,
+            textvariable=self.format_label,
+            values=[preset["label"] for preset in FORMAT_PRESETS.values()],
+            state="readonly",
+            width=18,
+        )
+        self.format_combo.grid(row=1, column=1, sticky="w", padx=8, pady=(8, 0))
+        self.format_combo.bind("<<ComboboxSelected>>", self.on_format_label_change)
+        extra_row = ttk.Frame(export_panel)
+        extra_row.grid(row=1, column=1, columnspan=2, sticky="w", padx=(180, 0), pady=(8, 0))
+        ttk.Label(extra_row, text="同时导出").pack(side=tk.LEFT)
+        self.extra_format_buttons: dict[str, ttk.Checkbutton] = {}
+        for key, preset in FORMAT_PRESETS.items():
+            button = ttk.Checkbutton(extra_row, text=preset["extension"][1:].upper(), variable=self.extra_formats[key])
+            button.pack(side=tk.LEFT, padx=(6, 0))
+            self.extra_format_buttons[key] = button
+
+        self.bitrate_label = ttk.Label(export_panel, text="码率")
+        self.bitrate_label.grid(row=2, column=0, sticky="w", pady=(8, 0))
+        self.bitrate_combo = ttk.Combobox(export_panel, textvariable=self.bitrate, state="readonly", width=8)
+        self.bitrate_combo.grid(row=2, column=1, sticky="w", padx=8, pady=(8, 0))
+        ttk.Checkbutton(export_panel, text="转单声道", variable=self.mix_to_mono).grid(
+            row=2, column=1, sticky="w", padx=(100, 0), pady=(8, 0)
+        )
+        ttk.Label(export_panel, text="并行数").grid(row=2, column=1, sticky="w", padx=(200, 0), pady=(8, 0))
+        workers = ttk.Combobox(
+            export_panel,
+            textvariable=self.export_workers,
+            values=sorted({"1", "2", "4", "8", str(DEFAULT_EXPORT_WORKERS)}, key=int),
+            width=4,
+        )
+        workers.grid(row=2, column=1, sticky="w", padx=(250, 0), pady=(8, 0))
+
+        ttk.Checkbutton(export_panel, text="只导出选中会话", variable=self.export_selected_only).grid(
+            row=3, column=0, columnspan=2, sticky="w", pady=(8, 0)
+        )
+        ttk.Checkbutton(export_panel, text="跳过已导出的会话", variable=self.resume_export).grid(
+            row=3, column=1, sticky="w", padx=(130, 0), pady=(8, 0)
+        )
+        ttk.Checkbutton(export_panel, text="导出成功后将源 WAV 移到废纸篓", variable=self.delete_sources_after_export).grid(
+            row=4, column=0, columnspan=3, sticky="w", pady=(8, 0)
+        )
+        ttk.Checkbutton(export_panel, text="缩短长时间静音", variable=self.trim_silence).grid(
+            row=5, column=0, columnspan=2, sticky="w", pady=(8, 0)
+        )
+        ttk.Checkbutton(export_panel, text="先复制到本机再转码（SD 卡/接收器）", variable=self.stage_sources).grid(
+            row=5, column=1, columnspan=2, sticky="w", padx=(130, 0), pady=(8, 0)
+        )
+        cache_row = ttk.Frame(export_panel)
+        cache_row.grid(row=6, column=0, columnspan=3, sticky="w", pady=(8, 0))
+        ttk.Checkbutton(cache_row, text="复用之前的转码结果，缓存上限", variable=self.use_export_cache).pack(side=tk.LEFT)
+        ttk.Combobox(
+            cache_row, textvariable=self.export_cache_limit, values=["2", "5", "10", "20", "50"], width=4
+        ).pack(side=tk.LEFT, padx=(6, 0))
+        ttk.Label(cache_row, text="GB").pack(side=tk.LEFT, padx=(4, 0))
+        self.export_button = ttk.Button(export_panel, text="开始批量导出", command=self.start_export)
+        self.export_button.grid(row=3, column=2, rowspan=2, sticky="e", pady=(8, 0))
+
+        file_toolbar = ttk.Frame(right)
+        file_toolbar.grid(row=0, column=0, sticky="ew", pady=(0, 6))
+        ttk.Label(file_toolbar, text="会话内文件").pack(side=tk.LEFT)
+        ttk.Button(file_toolbar, text="删除源文件", command=self.delete_selected_files_from_disk).pack(side=tk.RIGHT, padx=(6, 0))
+        ttk.Button(file_toolbar, text="移除文件", command=self.remove_selected_files).pack(side=tk.RIGHT, padx=(6, 0))
+        ttk.Button(file_toolbar, text="从此拆分", command=self.split_group_at_file).pack(side=tk.RIGHT, padx=(6, 0))
+
+        file_columns = ("name", "start", "duration", "size")
+        self.file_view = VirtualTreeview(
+            right,
+            file_columns,
+            row_count=lambda: len(self.file_view_group.files) if self.file_view_group else 0,
+            row_values=self.file_row_values,
+            on_select=self.on_file_select,
+        )
+        self.file_tree = self.file_view.tree
+        self.file_tree.heading("name", text="文件名")
+        self.file_tree.heading("start", text="开始时间")
+        self.file_tree.heading("duration", text="时长")
+        self.file_tree.heading("size", text="大小")
+        self.file_tree.column("name", width=250, anchor=tk.W)
+        self.file_tree.column("start", width=142, anchor=tk.W, stretch=False)
+        self.file_tree.column("duration", width=82, anchor=tk.CENTER, stretch=False)
+        self.file_tree.column("size", width=86, anchor=tk.E, stretch=False)
+        self.file_tree.grid(row=1, column=0, sticky="nsew")
+        self.file_view.scrollbar.grid(row=1, column=1, sticky="ns")
+
+        self.waveform_view = WaveformView(right, on_pick=self.on_waveform_pick)
+        self.waveform_view.canvas.grid(row=2, column=0, columnspan=2, sticky="ew", pady=(8, 0))
+
+        info = ttk.Frame(right)
+        info.grid(row=3, column=0, columnspan=2, sticky="ew", pady=(8, 0))
+        info.columnconfigure(0, weight=1)
+        ttk.Label(info, textvariable=self.status_text, wraplength=430).grid(row=0, column=0, sticky="ew")
+        ttk.Label(info, textvariable=self.timing_text, wraplength=430, foreground="#666666").grid(
+            row=1, column=0, sticky="ew"
+        )
+
+        bottom = ttk.Frame(self.root, padding=(12, 0, 12, 12))
+        bottom.grid(row=2, column=0, sticky="ew")
+        bottom.columnconfigure(0, weight=1)
+        ttk.Progressbar(bottom, variable=self.progress_value, maximum=100).grid(row=0, column=0, sticky="ew")
+        ttk.Label(bottom, textvariable=self.progress_text, width=28).grid(row=0, column=1, padx=(10, 0))
+
+        self.format_label.set(FORMAT_PRESETS[self.format_choice.get()]["label"])
+
+    def choose_folder(self) -> None:
+        initial = self.selected_folder.get() or str(Path.home())
+        folder = filedialog.askdirectory(title="选择 DJI Mic 录音文件夹", initialdir=initial)
+        if folder:
+            self.selected_folder.set(folder)
+            if not self.output_folder.get():
+                self.output_folder.set(str(Path(folder) / "converted"))
+            self.scan_selected_folder()
+
+    def choose_output_folder(self) -> None:
+        initial = self.output_folder.get() or self.selected_folder.get() or str(Path.home())
+        folder = filedialog.askdirectory(title="选择输出目录", initialdir=initial)
+        if folder:
+            self.output_folder.set(folder)
+            self.save_config()
+
+    def add_files(self) -> None:
+        initial = self.selected_folder.get() or str(Path.home())
+        paths = filedialog.askopenfilenames(
+            title="添加 WAV 文件",
+            initialdir=initial,
+            filetypes=[("WAV files", "*.wav *.WAV *.wave *.WAVE"), ("All files", "*.*")],
+        )
+        if not paths:
+            return
+        new_files = self.inspect_paths([Path(path) for path in paths])
+        existing = {item.path for item in self.audio_files}
+        added, displaced = self.duplicate_index.merge(item for item in new_files if item.path not in existing)
+        if displaced:
+            self.remove_files_from_state(displaced)
+        self.audio_files.extend(added)
+        self.apply_group_changes(self.session_index.add(added))
+        self.show_group_summary()
+
+    def toggle_scan(self) -> None:
+        if self.is_scanning:
+            self.scan_cancel_event.set()
+            self.status_text.set("正在停止扫描...")
+        else:
+            self.scan_selected_folder()
+
+    def scan_selected_folder(self, rebuild_cache: bool = False) -> None:
+        if self.is_scanning:
+            return
+        folder = Path(self.selected_folder.get()).expanduser()
+        if not folder.exists() or not folder.is_dir():
+            messagebox.showerror("错误", "请选择一个有效的文件夹。")
+            return
+
+        if not self.output_folder.get():
+            self.output_folder.set(str(folder / "converted"))
+        self.is_scanning = True
+        self.scan_cancel_event.clear()
+        self.scanner.stats = RunStats()
+        self.timing_text.set("")
+        self.audio_files = []
+        self.duplicate_index = DuplicateIndex()
+        self.apply_group_changes(self.session_index.rebuild([], self.get_threshold_minutes()))
+        self.progress_value.set(0)
+        self.progress_text.set("")
+        self.status_text.set("正在查找 WAV 文件...")
+        self.update_button_states()
+
+        output_folder = Path(self.output_folder.get()).expanduser()
+        worker = threading.Thread(
+            target=self.scan_worker,
+            args=(folder, self.recursive_scan.get(), rebuild_cache, output_folder),
+            daemon=True,
+        )
+        worker.start()
+
+    def scan_worker(self, folder: Path, recursive: bool, rebuild_cache: bool, output_folder: Path) -> None:
+        stats = self.scanner.stats
+        paths: list[Path] = []
+
+        def walk() -> Iterator[Path]:
+            # Files are handed to the inspect pool while the walk goes on; the total grows as folders are listed.
+            started = time.perf_counter()
+            for batch in iter_wav_files(folder, recursive, [output_folder], self.scan_ignore, self.scan_cancel_event):
+                paths.extend(batch)
+                self.post("scan_progress", (0, len(paths)))
+                yield from batch
+            stats.add("find_wav_files", time.perf_counter() - started, items=len(paths))
+
+        try:
+            if rebuild_cache:
+                self.scan_cache.clear()
+            done = 0
+            skipped = 0
+            started = time.perf_counter()
+            read_before = stats.bytes_read(*INSPECT_STAGES)
+            for batch, batch_skipped in self.scanner.iter_inspected_batches(walk(), self.scan_cancel_event):
+                done += len(batch) + batch_skipped
+                skipped += batch_skipped
+                self.post("scan_batch", batch)
+                self.post("scan_progress", (done, len(paths)))
+            total = len(paths)
+            stats.add(
+                "inspect_paths",
+                time.perf_counter() - started,
+                items=total,
+                bytes_read=stats.bytes_read(*INSPECT_STAGES) - read_before,
+            )
+
+            cancelled = self.scan_cancel_event.is_set()
+            if not cancelled:
+                self.scan_cache.prune(folder, set(paths), recursive)
+            self.post("scan_done", {"total": total, "skipped": skipped, "cancelled": cancelled})
+        except Exception as exc:
+            self.post("scan_done", {"error": str(exc)})
+
+    def inspect_paths(self, paths: list[Path]) -> list[AudioFile]:
+        inspected, skipped = self.scanner.inspect_paths(paths)
+        if skipped:
+            self.status_text.set(f"读取完成：{len(inspected)} 个文件可用，{skipped} 个文件被跳过。")
+        return inspected
+
+    def regroup_files(self) -> None:
+        with self.scanner.stats.measure("regroup_files", items=len(self.audio_files)):
+            splices = self.session_index.rebuild(self.audio_files, self.get_threshold_minutes())
+        self.apply_group_changes(splices)
+        self.save_config()
+        self.show_group_summary()
+
+    def apply_group_changes(self, splices: list[GroupSplice]) -> None:
+        if not splices:
+            return
+        self.group_view.apply_splices(splices)
+        self.refresh_file_tree()
+        self.update_button_states()
+        if not self.is_scanning:
+            self.update_threshold_preview()
+
+    def update_threshold_preview(self) -> None:
+        """Show how many sessions the typed threshold would give; nothing is regrouped until 重新分组."""
+        gaps = self.session_index.gaps()
+        threshold = self.get_threshold_minutes() * 60
+        self.gap_histogram.show(gaps.histogram(GAP_HISTOGRAM_EDGES + [math.inf]), threshold)
+        if not gaps.file_count:
+            self.threshold_preview.set("")
+            return
+        count = gaps.session_count(threshold)
+        current = len(self.groups)
+        suffix = f"（当前 {current} 个）" if count != current else ""
+        self.threshold_preview.set(f"约 {count} 个会话{suffix}")
+
+    def on_gap_histogram_pick(self, seconds: float) -> None:
+        minutes = seconds / 60
+        self.threshold_minutes.set(f"{minutes:.2f}" if minutes < 10 else f"{minutes:.0f}")
+
+    def show_group_summary(self) -> None:
+        if self.audio_files:
+            summary = f"已识别 {len(self.audio_files)} 个 WAV 文件，自动分成 {len(self.groups)} 个录音会话。"
+            duplicates = self.duplicate_index.duplicates
+            if duplicates:
+                copy, kept = duplicates[0]
+                summary += f"跳过了 {len(duplicates)} 个重复分段（如 {copy.path} 与 {kept.path} 内容相同）。"
+            self.status_text.set(summary)
+        else:
+            self.status_text.set("没有找到 WAV 文件。")
+        self.update_button_states()
+
+    def refresh_group_tree(self) -> None:
+        self.group_view.refresh()
+
+    def refresh_file_tree(self) -> None:
+        group = self.get_primary_selected_group()
+        if group is self.file_view_group:
+            self.file_view.refresh()
+        else:
+            self.file_view_group = group
+            self.file_view.reset()
+            self.load_waveform(group)
+
+    def load_waveform(self, group: RecordingGroup | None) -> None:
+        """Build the waveform of ``group`` off the Tk thread, abandoning the one still loading for another session."""
+        self.waveform_cancel.set()
+        self.waveform_cancel = threading.Event()
+        if group is None:
+            self.waveform_view.show_message("")
+            return
+        self.waveform_view.show_message("正在读取波形...")
+        threading.Thread(target=self.waveform_worker, args=(group, self.waveform_cancel), daemon=True).start()
+
+    def waveform_worker(self, group: RecordingGroup, cancel_event: threading.Event) -> None:
+        try:
+            waveform = load_waveform(group, self.peak_cache, cancel_event)
+        except Exception as exc:
+            self.post("waveform", (group, str(exc)))
+            return
+        if waveform is not None:
+            self.post("waveform", (group, waveform))
+
+    def show_waveform(self, group: RecordingGroup, waveform: Waveform | str) -> None:
+        if group is not self.file_view_group:
+            return
+        if isinstance(waveform, Waveform):
+            self.waveform_view.show(waveform)
+            self.waveform_view.set_highlight(self.get_selected_file_indices())
+        else:
+            self.waveform_view.show_message(waveform)
+
+    def on_file_select(self) -> None:
+        self.waveform_view.set_highlight(self.get_selected_file_indices())
+
+    def on_waveform_pick(self, index: int) -> None:
+        # Picking a chunk selects it, so "从此拆分" splits right where the waveform shows the break.
+        self.file_view.set_selection([index])
+        self.on_file_select()
+
+    def group_row_values(self, index: int) -> tuple:
+        group = self.groups[index]
+        return (
+            index + 1,
+            self.format_datetime(group.start_time),
+            len(group.files),
+            self.format_duration(group.duration),
+            self.format_size(group.size),
+            self.output_name_for_group(group),
+        )
+
+    def file_row_values(self, index: int) -> tuple:
+        assert self.file_view_group is not None
+        audio_file = self.file_view_group.files[index]
+        return (
+            audio_file.display_name,
+            self.format_datetime(audio_file.start_time),
+            self.format_duration(audio_file.duration),
+            self.format_size(audio_file.size),
+        )
+
+    def on_group_select(self) -> None:
+        self.refresh_file_tree()
+        self.update_button_states()
+
+    def merge_selected_groups(self) -> None:
+        indices = sorted(self.get_selected_group_indices())
+        if len(indices) < 2:
+            messagebox.showinfo("提示", "请选择至少两个录音会话。")
+            return
+
+        merged_files: list[AudioFile] = []
+        new_groups: list[RecordingGroup] = []
+        for index, group in enumerate(self.groups):
+            if index in indices:
+                merged_files.extend(group.files)
+                if index == indices[-1]:
+                    new_groups.append(RecordingGroup(files=sorted(merged_files, key=lambda item: item.start_time)))
+            else:
+                new_groups.append(group)
+
+        self.apply_group_changes(self.session_index.set_groups(new_groups))
+        self.status_text.set("已合并选中的录音会话。")
+
+    def split_group_at_file(self) -> None:
+        group_index = self.get_primary_selected_group_index()
+        if group_index is None:
+            return
+        file_indices = sorted(self.get_selected_file_indices())
+        if not file_indices:
+            messagebox.showinfo("提示", "请选择要作为新会话开头的文件。")
+            return
+
+        split_at = file_indices[0]
+        group = self.groups[group_index]
+        if split_at <= 0 or split_at >= len(group.files):
+            messagebox.showinfo("提示", "请选择会话中间的文件来拆分。")
+            return
+
+        first = RecordingGroup(files=group.files[:split_at])
+        second = RecordingGroup(files=group.files[split_at:])
+        self.session_index.splice(group_index, 1, [first, second], retitle=True, pinned=True)
+        self.group_view.set_selection([group_index + 1])
+        self.refresh_file_tree()
+        self.update_button_states()
+        self.status_text.set("已拆分录音会话。")
+
+    def remove_selected_files(self) -> None:
+        group_index = self.get_primary_selected_group_index()
+        if group_index is None:
+            return
+        file_indices = sorted(self.get_selected_file_indices(), reverse=True)
+        if not file_indices:
+            return
+
+        group = self.groups[group_index]
+        removed = [group.files[index] for index in file_indices if 0 <= index < len(group.files)]
+        self.remove_files_from_state(removed)
+        self.status_text.set("已移除选中的文件。")
+
+    def delete_selected_files_from_disk(self) -> None:
+        group_index = self.get_primary_selected_group_index()
+        if group_index is None:
+            return
+
+        group = self.groups[group_index]
+        file_indices = self.get_selected_file_indices()
+        files = [group.files[index] for index in file_indices if 0 <= index < len(group.files)]
+        self.delete_audio_files_from_disk(files)
+
+    def delete_selected_groups_from_disk(self) -> None:
+        indices = self.get_selected_group_indices()
+        files: list[AudioFile] = []
+        for index in indices:
+            if 0 <= index < len(self.groups):
+                files.extend(self.groups[index].files)
+        self.delete_audio_files_from_disk(files)
+
+    def delete_audio_files_from_disk(self, files: list[AudioFile]) -> None:
+        if not files:
+            return
+
+        count = len(files)
+        if not messagebox.askyesno(
+            "确认删除源文件",
+            f"将 {count} 个源 WAV 文件移到废纸篓/回收站。\n\n这个操作不会删除已经导出的文件。是否继续？",
+        ):
+            return
+
+        paths = [audio_file.path for audio_file in files]
+        try:
+            move_paths_to_trash(paths)
+        except Exception as exc:
+            messagebox.showerror("删除失败", str(exc))
+            return
+
+        self.remove_paths_from_state(set(paths))
+        self.status_text.set(f"已将 {count} 个源 WAV 文件移到废纸篓/回收站。")
+
+    def remove_paths_from_state(self, paths: set[Path]) -> None:
+        self.remove_files_from_state([item for item in self.audio_files if item.path in paths])
+
+    def remove_files_from_state(self, files: list[AudioFile]) -> None:
+        paths = {item.path for item in files}
+        self.audio_files = [item for item in self.audio_files if item.path not in paths]
+        self.duplicate_index.forget(paths)
+        self.apply_group_changes(self.session_index.remove(files))
+
+    def start_export(self) -> None:
+        if self.is_exporting:
+            return
+        if not self.ffmpeg and any(variant.format != "wav" for variant in self.get_export_settings().variants()):
+            messagebox.showerror("错误", "未找到 ffmpeg，请先安装 ffmpeg。")
+            return
+
+        output_folder = Path(self.output_folder.get()).expanduser()
+        if not output_folder:
+            messagebox.showerror("错误", "请选择输出目录。")
+            return
+
+        groups = self.get_groups_to_export()
+        if not groups:
+            messagebox.showerror("错误", "没有可导出的录音会话。")
+            return
+
+        delete_sources = self.delete_sources_after_export.get()
+        self.save_config()
+        self.exporter = Exporter(
+            self.ffmpeg,
+            self.get_export_settings(),
+            workers=self.get_export_workers(),
+            emit=self.post,
+            cache=self.open_export_cache(),
+            span_cache=self.scan_cache,
+            stage_sources=self.stage_sources.get(),
+        )
+        self.is_exporting = True
+        self.progress_value.set(0)
+        self.progress_text.set("准备导出...")
+        self.status_text.set("正在导出，请稍等。")
+        self.update_button_states()
+
+        worker = threading.Thread(
+            target=self.export_worker,
+            args=(self.exporter, groups, output_folder, delete_sources, self.resume_export.get()),
+            daemon=True,
+        )
+        worker.start()
+
+    def export_worker(
+        self,
+        exporter: Exporter,
+        groups: list[RecordingGroup],
+        output_folder: Path,
+        delete_sources: bool,
+        resume: bool,
+    ) -> None:
+        try:
+            self.post("done", exporter.export_groups(groups, output_folder, delete_sources, resume))
+        except Exception as exc:
+            self.post("error", str(exc))
+
+    def post(self, kind: str, payload: object) -> None:
+        """Queue a message from any thread and wake the Tk loop unless a wakeup is already on its way."""
+        self.work_queue.put((kind, payload))
+        if self.wakeup_pending.is_set():
+            return
+        self.wakeup_pending.set()
+        try:
+            self.root.event_generate(WORK_QUEUED_EVENT, when="tail")
+        except (RuntimeError, tk.TclError):
+            # The window is closing or the main loop has not started; the next post tries again.
+            self.wakeup_pending.clear()
+
+    def take_work_messages(self) -> list[tuple[str, object]]:
+        messages: list[tuple[str, object]] = []
+        try:
+            while True:
+                messages.append(self.work_queue.get_nowait())
+        except queue.Empty:
+            pass
+        newest = {kind: index for index, (kind, _payload) in enumerate(messages) if kind in LATEST_ONLY_MESSAGES}
+        return [
+            (kind, payload)
+            for index, (kind, payload) in enumerate(messages)
+            if kind not in LATEST_ONLY_MESSAGES or newest[kind] == index
+        ]
+
+    def drain_work_queue(self) -> None:
+        # Clear first: a message posted while draining raises a fresh wakeup instead of being stranded.
+        self.wakeup_pending.clear()
+        for kind, payload in self.take_work_messages():
+            if kind == "progress":
+                self.progress_value.set(float(payload))
+                self.progress_text.set(f"{float(payload):.1f}%")
+            elif kind == "status":
+                self.status_text.set(str(payload))
+            elif kind == "scan_progress":
+                done, total = payload
+                self.progress_value.set(done / total * 100 if total else 0)
+                self.progress_text.set(f"{done}/{total}")
+                self.status_text.set(f"正在读取 WAV 文件：{done}/{total}")
+            elif kind == "scan_batch":
+                # Batches finish in any order; merge keeps the same copy a sorted CLI scan would.
+                batch, displaced = self.duplicate_index.merge(payload)
+                if displaced:
+                    self.remove_files_from_state(displaced)
+                if batch:
+                    self.audio_files.extend(batch)
+                    self.apply_group_changes(self.session_index.add(batch))
+            elif kind == "waveform":
+                group, waveform = payload
+                self.show_waveform(group, waveform)
+            elif kind == "scan_done":
+                self.finish_scan(payload if isinstance(payload, dict) else {})
+            elif kind == "done":
+                result = payload if isinstance(payload, ExportResult) else ExportResult()
+                outputs = result.outputs
+                deleted_paths = result.deleted_paths
+                failures = result.failures
+                if deleted_paths:
+                    self.remove_paths_from_state(set(deleted_paths))
+                self.is_exporting = False
+                if self.exporter is not None:
+                    self.show_run_stats(self.exporter.stats)
+                self.progress_value.set(100)
+                self.progress_text.set("完成")
+                self.update_button_states()
+                suffix = f"（其中 {len(result.resumed)} 个此前已导出）" if result.resumed else ""
+                suffix += f"，并移除了 {len(deleted_paths)} 个源 WAV" if deleted_paths else ""
+                if failures:
+                    self.status_text.set(f"导出完成：{len(outputs)} 个文件{suffix}，{len(failures)} 个会话失败。")
+                    messagebox.showwarning(
+                        "部分导出失败",
+                        f"已导出 {len(outputs)} 个文件{suffix}。\n\n以下会话导出失败：\n\n" + "\n\n".join(failures),
+                    )
+                else:
+                    self.status_text.set(f"导出完成：{len(outputs)} 个文件{suffix}。")
+                    messagebox.showinfo("完成", f"已导出 {len(outputs)} 个文件{suffix}。")
+            elif kind == "error":
+                self.is_exporting = False
+                self.progress_value.set(0)
+                self.progress_text.set("失败")
+                self.update_button_states()
+                self.status_text.set("导出失败。")
+                messagebox.showerror("导出失败", str(payload))
+
+    def show_run_stats(self, stats: RunStats) -> None:
+        """Show the stage timings under the status line and keep them as the last-run log."""
+        self.timing_text.set(stats.summary())
+        try:
+            stats.write_log(RUN_LOG_PATH)
+        except OSError:
+            pass
+
+    def finish_scan(self, result: dict) -> None:
+        self.is_scanning = False
+        self.update_threshold_preview()
+        self.progress_value.set(0)
+        self.progress_text.set("")
+        self.save_config()
+        self.show_group_summary()
+        self.show_run_stats(self.scanner.stats)
+        if result.get("error"):
+            self.status_text.set("扫描失败。")
+            messagebox.showerror("扫描失败", str(result["error"]))
+        elif result.get("cancelled"):
+            self.status_text.set(f"扫描已停止：已读取 {len(self.audio_files)} 个文件，分成 {len(self.groups)} 个录音会话。")
+        elif result.get("skipped"):
+            self.status_text.set(f"读取完成：{len(self.audio_files)} 个文件可用，{result['skipped']} 个文件被跳过。")
+        self.update_button_states()
+
+    def update_format_controls(self) -> None:
+        output_format = self.format_choice.get()
+        preset = FORMAT_PRESETS[output_format]
+        self.format_label.set(preset["label"])
+        for key, button in self.extra_format_buttons.items():
+            button.configure(state=tk.DISABLED if key == output_format else tk.NORMAL)
+        self.bitrate_combo.configure(values=preset["bitrates"])
+        if preset["bitrates"]:
+            if self.bitrate.get() not in preset["bitrates"]:
+                self.bitrate.set(preset["default_bitrate"])
+            self.bitrate_combo.configure(state="readonly")
+            self.bitrate_label.configure(state="normal")
+        else:
+            self.bitrate.set("")
+            self.bitrate_combo.configure(state="disabled")
+            self.bitrate_label.configure(state="disabled")
+        self.refresh_group_tree()
+
+    def on_format_label_change(self, _event: tk.Event) -> None:
+        label = self.format_label.get()
+        for key, preset in FORMAT_PRESETS.items():
+            if preset["label"] == label:
+                self.format_choice.set(key)
+                break
+        self.update_format_controls()
+        self.save_config()
+
+    def normalize_format_key(self, value: object) -> str:
+        text = str(value)
+        if text in FORMAT_PRESETS:
+            return text
+        for key, preset in FORMAT_PRESETS.items():
+            if text == preset["label"]:
+                return key
+        return "m4a"
+
+    def update_button_states(self) -> None:
+        has_files = bool(self.audio_files)
+        has_groups = bool(self.groups)
+        busy = self.is_exporting or self.is_scanning
+        self.export_button.configure(state=tk.DISABLED if busy or not has_groups else tk.NORMAL)
+        self.scan_button.configure(
+            text="停止扫描" if self.is_scanning else "扫描",
+            state=tk.DISABLED if self.is_exporting else tk.NORMAL,
+        )
+        for widget in (self.group_tree, self.file_tree):
+            widget.configure(selectmode="none" if self.is_exporting else "extended")
+        if not has_files and not busy:
+            self.progress_text.set("")
+            self.progress_value.set(0)
+
+    def get_groups_to_export(self) -> list[RecordingGroup]:
+        if self.export_selected_only.get():
+            indices = self.get_selected_group_indices()
+            return [self.groups[index] for index in indices if 0 <= index < len(self.groups)]
+        return list(self.groups)
+
+    def get_primary_selected_group(self) -> RecordingGroup | None:
+        index = self.get_primary_selected_group_index()
+        return self.groups[index] if index is not None else None
+
+    def get_primary_selected_group_index(self) -> int | None:
+        indices = self.get_selected_group_indices()
+        return indices[0] if indices else None
+
+    def get_selected_group_indices(self) -> list[int]:
+        return self.group_view.selected_indices()
+
+    def get_selected_file_indices(self) -> list[int]:
+        return self.file_view.selected_indices()
+
+    def get_export_workers(self) -> int:
+        try:
+            return max(1, int(self.export_workers.get()))
+        except ValueError:
+            return DEFAULT_EXPORT_WORKERS
+
+    def get_export_cache_limit(self) -> int:
+        try:
+            return int(max(0.0, float(self.export_cache_limit.get())) * 1024**3)
+        except ValueError:
+            return EXPORT_CACHE_LIMIT
+
+    def open_export_cache(self) -> ExportCache | None:
+        if not self.use_export_cache.get():
+            return None
+        if self.export_cache is None:
+            self.export_cache = ExportCache()
+        if self.export_cache.limit != self.get_export_cache_limit():
+            # A lowered limit takes effect now rather than on the next stored output.
+            self.export_cache.limit = self.get_export_cache_limit()
+            self.export_cache.evict()
+        return self.export_cache
+
+    def get_export_settings(self) -> ExportSettings:
+        return ExportSettings(
+            format=self.format_choice.get(),
+            bitrate=self.bitrate.get(),
+            mix_to_mono=self.mix_to_mono.get(),
+            extra_formats=tuple(key for key, selected in self.extra_formats.items() if selected.get()),
+            trim_silence=self.trim_silence.get(),
+            **self.silence_limits,
+        )
+
+    def get_threshold_minutes(self) -> float:
+        try:
+            return max(0.0, float(self.threshold_minutes.get()))
+        except ValueError:
+            return 2.0
+
+    def output_name_for_group(self, group: RecordingGroup) -> str:
+        return output_name_for_group(group, self.get_export_settings())
+
+    def format_datetime(self, value: datetime | None) -> str:
+        return value.strftime("%Y-%m-%d %H:%M:%S") if value else "-"
+
+    def format_duration(self, seconds: float) -> str:
+        seconds = int(round(seconds))
+        hours, remainder = divmod(seconds, 3600)
+        minutes, seconds = divmod(remainder, 60)
+        if hours:
+            return f"{hours:02d}:{minutes:02d}:{seconds:02d}"
+        return f"{minutes:02d}:{seconds:02d}"
+
+    def format_size(self, size: int) -> str:
+        value = float(size)
+        for unit in ("B", "KB", "MB", "GB"):
+            if value < 1024:
+                return f"{value:.1f} {unit}"
+            value /= 1024
+        return f"{value:.1f} TB"
+
+    def on_close(self) -> None:
+        self.save_config()
+        self.scan_cancel_event.set()
+        if self.exporter is not None:
+            self.exporter.cancel()
+        self.scan_cache.close()
+        self.waveform_cancel.set()
+        if self.export_cache is not None:
+            self.export_cache.close()
+        self.peak_cache.close()
+        self.root.destroy()
+
+    def run(self) -> None:
+        self.root.mainloop()
+